@@ -1,13 +1,278 @@
+import asyncio
+import hashlib
 import json
+import os
+import time
 from typing import Dict, Any, List, Optional
+import httpx
+import numpy as np
 import requests
 import logging
 
+from retrieval.settings import PLAN_CACHE_JSONL
+from retrieval.query_index import embed_query
+
+try:
+    # msgspec parses and type-checks the plan in a single C-level pass;
+    # optional — the stdlib path below handles everything without it.
+    import msgspec
+
+    class _PlanStruct(msgspec.Struct):
+        goal: str
+        research_questions: List[str]
+        deliverable_requirements: List[Any]
+        draft_outline: List[Any]
+        success_criteria: List[Any]
+
+    _PLAN_DECODER = msgspec.json.Decoder(_PlanStruct)
+except ImportError:
+    msgspec = None
+    _PLAN_DECODER = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DEFAULT_OLLAMA_CHAT_MODEL = "qwen2.5:7b-instruct"
 
+# How long Ollama should keep the model resident after a call; avoids paying
+# a multi-second model reload between planner/research/writer turns.
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Shared session so repeated Ollama calls reuse pooled keep-alive connections
+# instead of paying a fresh TCP handshake per request.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=0),
+)
+_SESSION.headers.update({
+    "Connection": "keep-alive",
+    "Accept-Encoding": "gzip",
+})
+
+# Async clients for fanning out independent Ollama calls concurrently,
+# pooled per event loop: the sync run() wrapper spins up a fresh loop per
+# workflow via asyncio.run, and keep-alive connections bound to a closed
+# loop raise "Event loop is closed" when a later loop tries to reuse them.
+_ASYNC_CLIENTS: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        # Drop clients stranded on loops that have since closed.
+        for stale in [l for l in _ASYNC_CLIENTS if l.is_closed()]:
+            del _ASYNC_CLIENTS[stale]
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=120.0,
+        )
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+def prewarm_ollama(model: str = DEFAULT_OLLAMA_CHAT_MODEL) -> None:
+    """
+    Fire a minimal chat call so Ollama loads the model and the session pool
+    opens its TCP connection before the first real request. Best effort:
+    failures are logged and ignored.
+    """
+    try:
+        _SESSION.post(
+            "http://localhost:11434/api/chat",
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": "ok"}],
+                "stream": False,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": {"num_predict": 1},
+            },
+            timeout=30,
+        )
+        logger.info(f"Pre-warmed Ollama model {model}")
+    except Exception as e:
+        logger.warning(f"Ollama pre-warm failed (continuing without it): {e}")
+
+
+# Opt-in: pre-warm at import so the first planner call skips the model load
+if os.environ.get("PREWARM_OLLAMA"):
+    prewarm_ollama()
+
+
+# Exact-match plan cache: plans are a pure function of the user task and the
+# static schema prompt, so repeat tasks can skip the LLM call entirely.
+_PLAN_CACHE_TTL_SECONDS = 7 * 24 * 3600
+_PLAN_CACHE: Dict[str, Dict[str, Any]] = {}
+_plan_cache_loaded = False
+
+
+def _task_fingerprint(user_task: str) -> str:
+    """Stable cache key for a user task."""
+    return hashlib.sha256(user_task.strip().encode("utf-8")).hexdigest()
+
+
+def _load_plan_cache() -> None:
+    """Load the persisted plan cache once per process, dropping expired rows."""
+    global _plan_cache_loaded
+    if _plan_cache_loaded:
+        return
+    _plan_cache_loaded = True
+
+    try:
+        with open(PLAN_CACHE_JSONL, "r", encoding="utf-8") as f:
+            now = time.time()
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if now - row.get("ts", 0) > _PLAN_CACHE_TTL_SECONDS:
+                    continue
+                _PLAN_CACHE[row["key"]] = row
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to load plan cache: {e}")
+
+
+def _persist_plan_cache() -> None:
+    """Atomically rewrite the plan cache file (write temp, then os.replace)."""
+    try:
+        PLAN_CACHE_JSONL.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = str(PLAN_CACHE_JSONL) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in _PLAN_CACHE.values():
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, str(PLAN_CACHE_JSONL))
+    except Exception as e:
+        logger.warning(f"Failed to persist plan cache: {e}")
+
+
+def _cached_plan(user_task: str) -> Optional[Dict[str, Any]]:
+    """Return a cached plan_task result for this task, or None on miss."""
+    _load_plan_cache()
+    row = _PLAN_CACHE.get(_task_fingerprint(user_task))
+    if row is not None and time.time() - row.get("ts", 0) > _PLAN_CACHE_TTL_SECONDS:
+        _PLAN_CACHE.pop(_task_fingerprint(user_task), None)
+        row = None
+    if row is None:
+        # Exact miss: a paraphrased task may still hit the semantic cache
+        return _semantic_lookup(user_task)
+
+    logger.info("Plan cache hit; skipping LLM call")
+    return {
+        "status": "ok",
+        "user_task": user_task,
+        "plan": row["plan"],
+        "cached": True,
+    }
+
+
+def _store_plan(user_task: str, plan: Dict[str, Any]) -> None:
+    """Cache a validated plan and persist it to disk."""
+    key = _task_fingerprint(user_task)
+    _PLAN_CACHE[key] = {"key": key, "ts": time.time(), "plan": plan}
+    _persist_plan_cache()
+    _semantic_store(user_task, plan)
+
+
+# Semantic plan cache: catches paraphrased tasks that miss the exact-match
+# cache by comparing task embeddings (same embedding model as retrieval).
+# A plain numpy matrix is plenty at this cache size; entries are evicted LFU.
+_SEMANTIC_SIM_THRESHOLD = 0.90
+_SEMANTIC_CACHE_MAX = 64
+_semantic_vectors: List[np.ndarray] = []
+_semantic_plans: List[Dict[str, Any]] = []
+_semantic_uses: List[int] = []
+
+
+def _embed_task(user_task: str) -> Optional[np.ndarray]:
+    """Embed a task as a unit vector, or None if the embedding call fails."""
+    try:
+        vec = embed_query(user_task.strip())[0]
+    except Exception as e:
+        logger.warning(f"Task embedding failed; semantic plan cache skipped: {e}")
+        return None
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return None
+    return vec / norm
+
+
+def _semantic_store(user_task: str, plan: Dict[str, Any]) -> None:
+    """Add a plan to the semantic cache, evicting the least-used entry if full."""
+    vec = _embed_task(user_task)
+    if vec is None:
+        return
+
+    if len(_semantic_plans) >= _SEMANTIC_CACHE_MAX:
+        victim = _semantic_uses.index(min(_semantic_uses))
+        del _semantic_vectors[victim]
+        del _semantic_plans[victim]
+        del _semantic_uses[victim]
+
+    _semantic_vectors.append(vec)
+    _semantic_plans.append(plan)
+    _semantic_uses.append(0)
+
+
+def _semantic_lookup(user_task: str) -> Optional[Dict[str, Any]]:
+    """Return a cached plan whose task embedding is close enough, or None."""
+    if not _semantic_plans:
+        return None
+
+    vec = _embed_task(user_task)
+    if vec is None:
+        return None
+
+    sims = np.stack(_semantic_vectors) @ vec
+    best = int(np.argmax(sims))
+    if sims[best] < _SEMANTIC_SIM_THRESHOLD:
+        return None
+
+    _semantic_uses[best] += 1
+    logger.info(f"Semantic plan cache hit (similarity {sims[best]:.3f})")
+    return {
+        "status": "ok",
+        "user_task": user_task,
+        "plan": _semantic_plans[best],
+        "cached": True,
+    }
+
+
+def _read_ndjson_stream(r: requests.Response) -> str:
+    """
+    Consume a streamed Ollama chat response (NDJSON, one JSON object per line)
+    and return the concatenated message content.
+
+    Lines are buffered until they parse as complete JSON, so fragmented or
+    concatenated chunks from the transport cannot break decoding.
+    """
+    parts: List[str] = []
+    buf = ""
+
+    for line in r.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        buf += line
+        try:
+            chunk = json.loads(buf)
+        except json.JSONDecodeError:
+            continue  # partial line; keep buffering until it completes
+        buf = ""
+
+        message = chunk.get("message") or {}
+        content = message.get("content")
+        if content:
+            parts.append(content)
+        if chunk.get("done"):
+            break
+
+    return "".join(parts)
+
 
 def _ollama_chat(
         prompt: str,
@@ -34,7 +299,7 @@ def _ollama_chat(
 
     for attempt in range(max_retries):
         try:
-            r = requests.post(
+            r = _SESSION.post(
                 "http://localhost:11434/api/chat",
                 json={
                     "model": model,
@@ -45,13 +310,14 @@ def _ollama_chat(
                         },
                         {"role": "user", "content": prompt},
                     ],
-                    "stream": False,
+                    "stream": True,
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
                 },
                 timeout=timeout,
+                stream=True,
             )
             r.raise_for_status()
-            data = r.json()
-            return data["message"]["content"]
+            return _read_ndjson_stream(r)
 
         except requests.exceptions.Timeout as e:
             last_error = e
@@ -74,6 +340,72 @@ def _ollama_chat(
     )
 
 
+async def _ollama_chat_async(
+        prompt: str,
+        model: str = DEFAULT_OLLAMA_CHAT_MODEL,
+        max_retries: int = 2,
+        client: Optional[httpx.AsyncClient] = None,
+) -> str:
+    """
+    Async variant of _ollama_chat for issuing independent calls concurrently.
+
+    Args:
+        prompt: User prompt
+        model: Ollama model name
+        max_retries: Number of retry attempts
+        client: httpx.AsyncClient to use (defaults to the current loop's shared client)
+
+    Returns:
+        Model response text
+
+    Raises:
+        RuntimeError: If all attempts fail
+    """
+    client = client or _get_async_client()
+    last_error = None
+
+    for attempt in range(max_retries):
+        try:
+            r = await client.post(
+                "http://localhost:11434/api/chat",
+                json={
+                    "model": model,
+                    "messages": [
+                        {
+                            "role": "system",
+                            "content": "You are a planner. Produce concise, actionable plans. Follow the schema exactly."
+                        },
+                        {"role": "user", "content": prompt},
+                    ],
+                    "stream": False,
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                },
+            )
+            r.raise_for_status()
+            data = r.json()
+            return data["message"]["content"]
+
+        except httpx.TimeoutException as e:
+            last_error = e
+            logger.warning(f"Attempt {attempt + 1}/{max_retries} timed out")
+        except httpx.ConnectError as e:
+            last_error = e
+            logger.error(f"Connection error: {e}. Is Ollama running on localhost:11434?")
+            break
+        except httpx.HTTPStatusError as e:
+            last_error = e
+            logger.error(f"HTTP error: {e.response.status_code} - {e.response.text}")
+            break
+        except Exception as e:
+            last_error = e
+            logger.error(f"Unexpected error: {e}")
+            break
+
+    raise RuntimeError(
+        f"Failed to get response from Ollama after {max_retries} attempts: {last_error}"
+    )
+
+
 def _safe_json_load(s: str) -> Optional[Dict[str, Any]]:
     """
     Safely parse JSON with fallback strategies.
@@ -118,6 +450,51 @@ def _safe_json_load(s: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+# The plan schema is fixed at import time, so the validator is generated once
+# as straight-line code (no field loop, no per-call schema interpretation).
+_PLAN_LIST_FIELDS = (
+    "research_questions",
+    "deliverable_requirements",
+    "draft_outline",
+    "success_criteria",
+)
+
+
+def _compile_plan_validator():
+    """Generate a specialized validator function for the fixed plan schema."""
+    lines = [
+        "def _validate_plan_compiled(plan):",
+        "    issues = []",
+        "    if 'goal' not in plan:",
+        "        issues.append(\"Missing required field: 'goal'\")",
+        "    elif not isinstance(plan['goal'], str):",
+        "        issues.append(\"Field 'goal' must be a string\")",
+    ]
+    for f in _PLAN_LIST_FIELDS:
+        lines += [
+            f"    if {f!r} not in plan:",
+            f"        issues.append(\"Missing required field: '{f}'\")",
+            f"    elif not isinstance(plan[{f!r}], list):",
+            f"        issues.append(\"Field '{f}' must be a list\")",
+            f"    if {f!r} in plan:",
+            f"        if not plan[{f!r}]:",
+            f"            issues.append(\"'{f}' cannot be empty\")",
+        ]
+        if f == "research_questions":
+            lines += [
+                f"        elif not all(isinstance(q, str) for q in plan[{f!r}]):",
+                f"            issues.append(\"All items in '{f}' must be strings\")",
+            ]
+    lines.append("    return issues")
+
+    namespace: Dict[str, Any] = {}
+    exec("\n".join(lines), namespace)
+    return namespace["_validate_plan_compiled"]
+
+
+_VALIDATE_PLAN = _compile_plan_validator()
+
+
 def _validate_plan(plan: Dict[str, Any]) -> List[str]:
     """
     Validate plan structure and return list of issues.
@@ -128,80 +505,12 @@ def _validate_plan(plan: Dict[str, Any]) -> List[str]:
     Returns:
         List of validation error messages (empty if valid)
     """
-    issues = []
-
-    # Check required fields
-    required_fields = [
-        "goal",
-        "research_questions",
-        "deliverable_requirements",
-        "draft_outline",
-        "success_criteria"
-    ]
-
-    for field in required_fields:
-        if field not in plan:
-            issues.append(f"Missing required field: '{field}'")
-        elif field != "goal" and not isinstance(plan.get(field), list):
-            issues.append(f"Field '{field}' must be a list")
-        elif field == "goal" and not isinstance(plan.get(field), str):
-            issues.append(f"Field 'goal' must be a string")
-
-    # Check list fields are non-empty
-    if "research_questions" in plan:
-        if not plan["research_questions"]:
-            issues.append("'research_questions' cannot be empty")
-        elif not all(isinstance(q, str) for q in plan["research_questions"]):
-            issues.append("All items in 'research_questions' must be strings")
-
-    if "deliverable_requirements" in plan:
-        if not plan["deliverable_requirements"]:
-            issues.append("'deliverable_requirements' cannot be empty")
-
-    if "draft_outline" in plan:
-        if not plan["draft_outline"]:
-            issues.append("'draft_outline' cannot be empty")
-
-    if "success_criteria" in plan:
-        if not plan["success_criteria"]:
-            issues.append("'success_criteria' cannot be empty")
-
-    return issues
-
-
-def plan_task(
-        user_task: str,
-        model: str = DEFAULT_OLLAMA_CHAT_MODEL,
-        validate: bool = True
-) -> Dict[str, Any]:
-    """
-    Generate an execution plan for a multi-agent workflow.
-
-    The plan guides downstream agents through: Plan → Research → Draft → Verify → Deliver
-
-    Args:
-        user_task: User's natural language task description
-        model: Ollama model to use for planning
-        validate: Whether to validate plan structure
-
-    Returns:
-        Dict with:
-        - status: "ok" or "error"
-        - plan: Parsed plan dict (if successful)
-        - message/raw_output: Error details (if failed)
-        - validation_issues: List of issues (if validation enabled and issues found)
-    """
-    # Input validation
-    if not user_task or not user_task.strip():
-        return {
-            "status": "error",
-            "message": "Empty task provided.",
-            "user_task": user_task,
-        }
+    return _VALIDATE_PLAN(plan)
 
-    logger.info(f"Planning task: {user_task[:100]}...")
 
-    prompt = f"""
+def _plan_prompt(user_task: str) -> str:
+    """Build the planning prompt for a given user task."""
+    return f"""
 Create an execution plan for a multi-agent workflow: Plan → Research → Draft → Verify → Deliver.
 
 Return ONLY valid JSON with this schema:
@@ -234,19 +543,20 @@ USER TASK:
 {user_task}
 """.strip()
 
-    # Call LLM
-    try:
-        raw = _ollama_chat(prompt, model=model)
-    except Exception as e:
-        logger.error(f"Failed to get LLM response: {e}")
-        return {
-            "status": "error",
-            "message": f"Failed to communicate with LLM: {str(e)}",
-            "user_task": user_task,
-        }
 
-    # Parse JSON response
-    plan = _safe_json_load(raw)
+def _finish_plan(user_task: str, raw: str, validate: bool) -> Dict[str, Any]:
+    """Parse and validate the raw planner output into a plan_task result."""
+    # Fast path: msgspec decodes and type-checks well-formed output in one
+    # C pass; anything it rejects falls back to the tolerant extraction below.
+    plan = None
+    if _PLAN_DECODER is not None:
+        try:
+            plan = msgspec.to_builtins(_PLAN_DECODER.decode(raw))
+        except msgspec.DecodeError:
+            plan = None
+
+    if plan is None:
+        plan = _safe_json_load(raw)
 
     if plan is None:
         logger.error(f"Failed to parse JSON from LLM output: {raw[:500]}")
@@ -273,6 +583,8 @@ USER TASK:
 
     logger.info(f"Successfully created plan with {len(plan.get('research_questions', []))} research questions")
 
+    _store_plan(user_task, plan)
+
     return {
         "status": "ok",
         "user_task": user_task,
@@ -280,6 +592,97 @@ USER TASK:
     }
 
 
+def plan_task(
+        user_task: str,
+        model: str = DEFAULT_OLLAMA_CHAT_MODEL,
+        validate: bool = True
+) -> Dict[str, Any]:
+    """
+    Generate an execution plan for a multi-agent workflow.
+
+    The plan guides downstream agents through: Plan → Research → Draft → Verify → Deliver
+
+    Args:
+        user_task: User's natural language task description
+        model: Ollama model to use for planning
+        validate: Whether to validate plan structure
+
+    Returns:
+        Dict with:
+        - status: "ok" or "error"
+        - plan: Parsed plan dict (if successful)
+        - message/raw_output: Error details (if failed)
+        - validation_issues: List of issues (if validation enabled and issues found)
+    """
+    # Input validation
+    if not user_task or not user_task.strip():
+        return {
+            "status": "error",
+            "message": "Empty task provided.",
+            "user_task": user_task,
+        }
+
+    # Cached plans were already validated before being stored
+    cached = _cached_plan(user_task)
+    if cached is not None:
+        return cached
+
+    logger.info(f"Planning task: {user_task[:100]}...")
+
+    # Call LLM
+    try:
+        raw = _ollama_chat(_plan_prompt(user_task), model=model)
+    except Exception as e:
+        logger.error(f"Failed to get LLM response: {e}")
+        return {
+            "status": "error",
+            "message": f"Failed to communicate with LLM: {str(e)}",
+            "user_task": user_task,
+        }
+
+    return _finish_plan(user_task, raw, validate)
+
+
+async def aplan_task(
+        user_task: str,
+        model: str = DEFAULT_OLLAMA_CHAT_MODEL,
+        validate: bool = True
+) -> Dict[str, Any]:
+    """
+    Async variant of plan_task; same result shape, non-blocking LLM call.
+
+    Use this when planning runs alongside other async work (e.g. concurrent
+    research queries) so the event loop is not blocked on network I/O.
+    """
+    if not user_task or not user_task.strip():
+        return {
+            "status": "error",
+            "message": "Empty task provided.",
+            "user_task": user_task,
+        }
+
+    # The cache layers block: semantic lookup/store embed the task over the
+    # sync httpx client and _store_plan rewrites the cache file. Run them in
+    # worker threads so the event loop stays free for concurrent work.
+    cached = await asyncio.to_thread(_cached_plan, user_task)
+    if cached is not None:
+        return cached
+
+    logger.info(f"Planning task: {user_task[:100]}...")
+
+    try:
+        raw = await _ollama_chat_async(_plan_prompt(user_task), model=model)
+    except Exception as e:
+        logger.error(f"Failed to get LLM response: {e}")
+        return {
+            "status": "error",
+            "message": f"Failed to communicate with LLM: {str(e)}",
+            "user_task": user_task,
+        }
+
+    return await asyncio.to_thread(_finish_plan, user_task, raw, validate)
+
+
 if __name__ == "__main__":
     # Example 1: Valid task
     task = "Turn dementia guideline evidence into a decision-ready deliverable for a clinic lead about managing agitation."
@@ -1,16 +1,37 @@
+import asyncio
 import json
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional
+import mmap
+import os
+import pickle
+from dataclasses import dataclass, asdict, field
+from typing import List, Dict, Any, NamedTuple, Optional
 import logging
 
+import numpy as np
+
 from retrieval.settings import CHUNKS_JSONL, TOP_K
-from retrieval.query_index import query_index
+from retrieval.query_index import query_index, query_index_async, query_index_batch
+
+try:
+    import msgspec.json
+
+    _json_loads = msgspec.json.decode
+except ImportError:
+    try:
+        import orjson
+
+        _json_loads = orjson.loads
+    except ImportError:  # both accelerators optional; stdlib json still works
+        _json_loads = json.loads
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@dataclass(frozen=True)
+_ELLIPSIS = "…"
+
+
+@dataclass(frozen=True, slots=True)
 class Evidence:
     """Immutable evidence object with citation generation."""
     idx: int
@@ -20,12 +41,21 @@ class Evidence:
     page: int
     section: str
     text: str
+    _citation: str = field(init=False, repr=False)
 
-    def citation(self) -> str:
-        """Generate a formatted citation string."""
-        # Clean up section display
+    def __post_init__(self):
+        # Build the citation once at construction; frozen+slots means no
+        # cached_property, so set it via object.__setattr__.
         sec = self.section if self.section and self.section != "NO_SECTION" else "NO_SECTION"
-        return f"{self.doc_name} | page {self.page} | section {sec} | chunk {self.idx}"
+        object.__setattr__(
+            self,
+            "_citation",
+            f"{self.doc_name} | page {self.page} | section {sec} | chunk {self.idx}",
+        )
+
+    def citation(self) -> str:
+        """Return the precomputed citation string."""
+        return self._citation
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary with citation included."""
@@ -41,31 +71,125 @@ class Evidence:
         }
 
 
+class ChunkRow(NamedTuple):
+    """One chunk read back from the store, with metadata flattened."""
+    text: str
+    doc_name: str
+    page: int
+    section: str
+
+
 class EvidenceStore:
-    """Loads and provides access to chunked document data."""
+    """
+    Loads and provides access to chunked document data.
+
+    Chunks are held as parallel columns (structure-of-arrays) rather than a
+    list of per-row dicts: one doc-name list, an int32 page array, and one
+    section list. Chunk text — the bulk of the corpus — is not held in RAM
+    at all: a packed int64 (offset, length) sidecar (chunks.jsonl.idx) maps
+    each idx to its JSONL row, and get_text_and_meta slices the memory-mapped
+    file and parses just that one row on demand. Only the top_k rows touched
+    per query are ever materialized.
+    """
 
     def __init__(self, chunks_jsonl_path: str):
         self._path = chunks_jsonl_path
-        self._chunks: Optional[List[Dict[str, Any]]] = None
+        self._doc_names: Optional[List[str]] = None
+        self._pages: Optional[np.ndarray] = None
+        self._sections: Optional[List[str]] = None
+        self._offsets: Optional[np.ndarray] = None  # shape (N, 2): offset, length
+        self._mm: Optional[mmap.mmap] = None
+
+    def _pickle_path(self) -> str:
+        return str(self._path) + ".pkl"
+
+    def _index_path(self) -> str:
+        return str(self._path) + ".idx"
+
+    def _load_from_cache(self) -> bool:
+        """Load metadata columns + offset index if both are newer than the JSONL."""
+        pkl = self._pickle_path()
+        idx_path = self._index_path()
+        try:
+            jsonl_mtime = os.path.getmtime(self._path)
+            if os.path.getmtime(pkl) < jsonl_mtime or os.path.getmtime(idx_path) < jsonl_mtime:
+                return False  # JSONL re-ingested since the cache was written
+            with open(pkl, "rb") as f:
+                columns = pickle.load(f)
+            offsets = np.fromfile(idx_path, dtype=np.int64).reshape(-1, 2)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable chunk cache {pkl}: {e}")
+            return False
+
+        # Older caches used a different layout; ignore those and re-parse
+        if not isinstance(columns, dict) or "doc_names" not in columns:
+            return False
+        if len(offsets) != len(columns["doc_names"]):
+            return False
+
+        self._set_columns(columns, offsets)
+        logger.info(f"Loaded {len(offsets)} chunks from cache {pkl}")
+        return True
+
+    def _save_cache(self, columns: Dict[str, Any], offsets: np.ndarray) -> None:
+        """Write the metadata cache and offset index so later loads skip parsing."""
+        pkl = self._pickle_path()
+        idx_path = self._index_path()
+        try:
+            tmp = pkl + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(columns, f, protocol=5)
+            os.replace(tmp, pkl)
+
+            tmp = idx_path + ".tmp"
+            offsets.tofile(tmp)
+            os.replace(tmp, idx_path)
+        except Exception as e:
+            logger.warning(f"Failed to write chunk cache {pkl}: {e}")
+
+    def _set_columns(self, columns: Dict[str, Any], offsets: np.ndarray) -> None:
+        self._doc_names = columns["doc_names"]
+        self._pages = np.asarray(columns["pages"], dtype=np.int32)
+        self._sections = columns["sections"]
+        self._offsets = offsets
 
     def load(self) -> None:
-        """Lazy load chunks from JSONL file."""
-        if self._chunks is not None:
+        """Lazy load chunk metadata, preferring the binary cache over JSONL parsing."""
+        if self._offsets is not None:
             return
 
-        chunks = []
+        if self._load_from_cache():
+            return
+
+        doc_names: List[str] = []
+        pages: List[int] = []
+        sections: List[str] = []
+        offsets: List[int] = []
         try:
-            with open(self._path, "r", encoding="utf-8") as f:
-                for line_num, line in enumerate(f, start=1):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        row = json.loads(line)
-                        chunks.append(row)
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Skipping malformed JSON on line {line_num}: {e}")
-                        continue
+            # One bulk read + manual offset tracking: each kept row records
+            # its (byte offset, length) so text can be re-read lazily later.
+            with open(self._path, "rb") as f:
+                data = f.read()
+            pos = 0
+            for line_num, line in enumerate(data.split(b"\n"), start=1):
+                offset = pos
+                pos += len(line) + 1
+                if not line.strip():
+                    continue
+                try:
+                    row = _json_loads(line)
+                except ValueError as e:
+                    logger.warning(f"Skipping malformed JSON on line {line_num}: {e}")
+                    continue
+                meta = row.get("metadata") or {}
+                doc_names.append(str(meta.get("doc_name") or "UNKNOWN_DOC"))
+                page = meta.get("page")
+                pages.append(int(page) if page is not None else -1)
+                sections.append(str(meta.get("section") or "NO_SECTION"))
+                offsets.append(offset)
+                offsets.append(len(line))
         except FileNotFoundError:
             logger.error(f"Chunks file not found: {self._path}")
             raise
@@ -73,13 +197,39 @@ class EvidenceStore:
             logger.error(f"Error loading chunks: {e}")
             raise
 
-        if not chunks:
-            logger.warning(f"No chunks loaded from {self._path}")
+        columns = {
+            "doc_names": doc_names,
+            "pages": pages,
+            "sections": sections,
+        }
+        offset_arr = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
 
-        self._chunks = chunks
-        logger.info(f"Loaded {len(chunks)} chunks from {self._path}")
+        if not doc_names:
+            logger.warning(f"No chunks loaded from {self._path}")
+        else:
+            self._save_cache(columns, offset_arr)
+
+        self._set_columns(columns, offset_arr)
+        logger.info(f"Loaded {len(doc_names)} chunks from {self._path}")
+
+    def _mmap_file(self) -> mmap.mmap:
+        """Open (once) a read-only memory map of the JSONL file."""
+        if self._mm is None:
+            with open(self._path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def _get_text(self, idx: int) -> str:
+        """Read one chunk's text by slicing its row out of the mmap."""
+        offset, length = self._offsets[idx]
+        raw = self._mmap_file()[int(offset): int(offset) + int(length)]
+        try:
+            return _json_loads(raw).get("text") or ""
+        except ValueError as e:
+            logger.warning(f"Malformed JSON for chunk {idx}: {e}")
+            return ""
 
-    def get_text_and_meta(self, idx: int) -> Dict[str, Any]:
+    def get_text_and_meta(self, idx: int) -> ChunkRow:
         """
         Retrieve chunk by index.
 
@@ -87,25 +237,30 @@ class EvidenceStore:
             idx: Zero-based chunk index
 
         Returns:
-            Dict with 'text' and 'metadata' keys
+            ChunkRow with text, doc_name, page, and section
 
         Raises:
             IndexError: If idx is out of range
         """
         self.load()
-        assert self._chunks is not None
+        assert self._offsets is not None
 
-        if idx < 0 or idx >= len(self._chunks):
+        if idx < 0 or idx >= len(self._offsets):
             raise IndexError(
-                f"Chunk idx out of range: {idx} (valid range: 0..{len(self._chunks) - 1})"
+                f"Chunk idx out of range: {idx} (valid range: 0..{len(self._offsets) - 1})"
             )
 
-        return self._chunks[idx]
+        return ChunkRow(
+            text=self._get_text(idx),
+            doc_name=self._doc_names[idx],
+            page=int(self._pages[idx]),
+            section=self._sections[idx],
+        )
 
     def get_chunk_count(self) -> int:
         """Return total number of chunks available."""
         self.load()
-        return len(self._chunks) if self._chunks else 0
+        return len(self._offsets) if self._offsets is not None else 0
 
 
 class ResearchAgent:
@@ -193,6 +348,88 @@ class ResearchAgent:
                 "evidence": [],
             }
 
+        return self._hits_to_result(question, hits)
+
+    def search_batch(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Execute several research queries with one batched embedding pass.
+
+        Returns one search-result dict per question, in order; empty questions
+        get their usual not_found result without touching the backend.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+        pending: List[str] = []
+        pending_pos: List[int] = []
+
+        for i, q in enumerate(questions):
+            if not q or not q.strip():
+                logger.warning("Empty question provided to search")
+                results[i] = {
+                    "status": "not_found",
+                    "message": "Empty query provided.",
+                    "question": q,
+                    "evidence": [],
+                }
+            else:
+                pending.append(q)
+                pending_pos.append(i)
+
+        if pending:
+            logger.info(f"Batched research queries: {len(pending)}")
+            try:
+                hit_lists = query_index_batch(pending, top_k=self.top_k)
+            except Exception as e:
+                logger.error(f"Batched query index failed: {e}")
+                for i, q in zip(pending_pos, pending):
+                    results[i] = {
+                        "status": "error",
+                        "message": f"Vector search failed: {str(e)}",
+                        "question": q,
+                        "evidence": [],
+                    }
+            else:
+                for i, q, hits in zip(pending_pos, pending, hit_lists):
+                    results[i] = self._hits_to_result(q, hits)
+
+        return results
+
+    async def asearch(self, question: str) -> Dict[str, Any]:
+        """Async variant of search; same result shape."""
+        if not question or not question.strip():
+            logger.warning("Empty question provided to search")
+            return {
+                "status": "not_found",
+                "message": "Empty query provided.",
+                "question": question,
+                "evidence": [],
+            }
+
+        logger.info(f"Research query: {question}")
+
+        try:
+            hits = await query_index_async(question, top_k=self.top_k)
+        except Exception as e:
+            logger.error(f"Query index failed: {e}")
+            return {
+                "status": "error",
+                "message": f"Vector search failed: {str(e)}",
+                "question": question,
+                "evidence": [],
+            }
+
+        return self._hits_to_result(question, hits)
+
+    async def asearch_many(self, questions: List[str]) -> List[Dict[str, Any]]:
+        """
+        Run several research queries concurrently.
+
+        Latency is max-of-N instead of sum-of-N because the embedding calls
+        overlap on the event loop.
+        """
+        return list(await asyncio.gather(*(self.asearch(q) for q in questions)))
+
+    def _hits_to_result(self, question: str, hits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply the quality gate and enrich hits into the search result dict."""
         # Check quality gate
         not_found_msg = self._gate_not_found(hits)
         if not_found_msg:
@@ -204,8 +441,9 @@ class ResearchAgent:
                 "evidence": [],
             }
 
-        # Enrich hits with full text and metadata
-        evidence_blocks: List[Evidence] = []
+        # Enrich hits with full text and metadata; build the output dicts in
+        # the same pass instead of keeping Evidence objects for a second walk.
+        evidence_blocks: List[Dict[str, Any]] = []
 
         for h in hits:
             idx = h.get("idx")
@@ -219,45 +457,27 @@ class ResearchAgent:
                 logger.error(f"Failed to fetch chunk {idx}: {e}")
                 continue
 
-            # Extract text
-            text = (row.get("text") or "").strip()
+            # Columns are already normalized at load time, so this is four
+            # plain attribute reads instead of nested .get() fallback chains.
+            text = row.text.strip()
             if not text:
                 logger.warning(f"Chunk {idx} has no text, skipping")
                 continue
 
-            # Extract metadata (may be nested or flat)
-            meta = row.get("metadata") or {}
-
-            # Prioritize metadata fields, fall back to hit-level fields
-            doc_name = (
-                    meta.get("doc_name")
-                    or h.get("doc_name")
-                    or "UNKNOWN_DOC"
-            )
-            page = meta.get("page") or h.get("page")
-            if page is None:
-                page = -1  # Indicate missing page
-
-            section = (
-                    meta.get("section")
-                    or h.get("section")
-                    or "NO_SECTION"
-            )
-
             # Truncate long text
             if len(text) > self.max_chars:
-                text = text[: self.max_chars].rstrip() + "…"
+                text = text[: self.max_chars].rstrip() + _ELLIPSIS
 
             evidence_blocks.append(
                 Evidence(
                     idx=idx,
                     rank=h.get("rank", len(evidence_blocks) + 1),
                     distance=h.get("distance", 1.0),
-                    doc_name=str(doc_name),
-                    page=int(page),
-                    section=str(section),
+                    doc_name=row.doc_name,
+                    page=row.page,
+                    section=row.section,
                     text=text,
-                )
+                ).to_dict()
             )
 
         if not evidence_blocks:
@@ -274,7 +494,7 @@ class ResearchAgent:
         return {
             "status": "found",
             "question": question,
-            "evidence": [e.to_dict() for e in evidence_blocks],
+            "evidence": evidence_blocks,
         }
 
 
@@ -1,14 +1,31 @@
 import json
-from typing import Dict, Any, List, Optional
+import time
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Union
 import requests
 import logging
 
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; stdlib json works, just slower
+    _json_loads = json.loads
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DEFAULT_OLLAMA_CHAT_MODEL = "qwen2.5:7b-instruct"
 NOT_FOUND = "Not found in sources."
 
+# Shared session so repeated writer calls reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16),
+)
+_SESSION.headers.update({"Connection": "keep-alive"})
+
 
 def _build_citation(e: Dict[str, Any]) -> str:
     citation = e.get("citation")
@@ -27,72 +44,187 @@ def _build_citation(e: Dict[str, Any]) -> str:
     return " | ".join(parts) if parts else "Unknown source"
 
 
-def _build_evidence_context(evidence: List[Dict[str, Any]], max_items: int = 8) -> str:
+# Retry loops re-render the context for the same evidence list object; the
+# dicts are unhashable, so key on id(). The value keeps a strong reference
+# to the list: that pins the id for the entry's lifetime (CPython reuses
+# freed addresses, so an unpinned id could silently alias a *different*
+# later list), and hits verify identity before trusting the entry.
+_EV_CACHE: Dict[Any, Tuple[List[Dict[str, Any]], str, List[str]]] = {}
+_EV_CACHE_MAX = 128
+
+# Per-item cap on evidence text in the prompt; prefill cost scales with
+# context length, so one oversized chunk shouldn't blow the latency budget
+MAX_EV_CHARS = 1200
+
+
+def _build_evidence_context(
+    evidence: List[Dict[str, Any]], max_items: int = 8
+) -> Tuple[str, List[str]]:
+    """
+    Render the [E1..En] context block and return it with the per-item
+    citations (one per evidence item used, in E-number order) so callers
+    building the sources list don't re-derive them.
+    """
     if not evidence:
-        return ""
+        return "", []
+
+    key = (id(evidence), len(evidence), max_items)
+    cached = _EV_CACHE.get(key)
+    if cached is not None and cached[0] is evidence:
+        return cached[1], cached[2]
 
     ev = evidence[:max_items]
     blocks = []
+    citations = []
+    append = blocks.append
     for i, e in enumerate(ev, start=1):
-        text = (e.get("text") or "").strip()
+        eget = e.get
+        # Common case: evidence already carries a citation; only fall back to
+        # the part-by-part builder when it doesn't
+        citation = eget("citation") or _build_citation(e)
+        citations.append(citation)
+        text = (eget("text") or "").strip()
         if not text:
             continue
-        citation = _build_citation(e)
-        blocks.append(f"[E{i}] {citation}\n{text}")
+        if len(text) > MAX_EV_CHARS:
+            logger.debug("Truncating evidence E%d from %d chars", i, len(text))
+            half = MAX_EV_CHARS // 2
+            text = text[:half] + " …[truncated]… " + text[-half:]
+        append(f"[E{i}] {citation}\n{text}")
+
+    context = "\n\n".join(blocks)
 
-    return "\n\n".join(blocks)
+    if len(_EV_CACHE) >= _EV_CACHE_MAX:
+        _EV_CACHE.clear()
+    _EV_CACHE[key] = (evidence, context, citations)
+    return context, citations
+
+
+# Separate connect/read timeouts: a wedged Ollama surfaces in seconds instead
+# of blocking a worker for minutes across retries
+_OLLAMA_TIMEOUT = (5, 30)
+
+_SYSTEM_ROLE = (
+    "You are a strict, citation-grounded technical writer. "
+    "Use ONLY the provided evidence. "
+    "Return ONLY valid JSON that matches the schema exactly. "
+    "Never invent facts, names, dates, or timelines. "
+    f'Use "{NOT_FOUND}" ONLY for fields that cannot be supported by evidence.'
+)
 
 
 def _ollama_chat(
     prompt: str,
     model: str = DEFAULT_OLLAMA_CHAT_MODEL,
-    timeout: int = 120,
-    max_retries: int = 2
+    timeout: Union[int, Tuple[int, int]] = _OLLAMA_TIMEOUT,
+    max_retries: int = 2,
+    system: str = _SYSTEM_ROLE,
+) -> str:
+    # Content-addressed cache: identical prompt+model means identical evidence
+    # and task, so re-runs and retry loops skip the multi-second LLM call.
+    # lru_cache does not cache raised exceptions, so failures are retried.
+    return _ollama_chat_cached(prompt, model, timeout, max_retries, system)
+
+
+@lru_cache(maxsize=256)
+def _ollama_chat_cached(
+    prompt: str,
+    model: str,
+    timeout: Union[int, Tuple[int, int]],
+    max_retries: int,
+    system: str,
 ) -> str:
     last_error = None
 
     for attempt in range(max_retries):
+        if attempt:
+            # Brief exponential backoff so retries don't hammer a slow server
+            time.sleep(0.5 * (2 ** (attempt - 1)))
         try:
-            r = requests.post(
+            with _SESSION.post(
                 "http://localhost:11434/api/chat",
                 json={
                     "model": model,
                     "messages": [
-                        {
-                            "role": "system",
-                            "content": (
-                                "You are a strict, citation-grounded technical writer. "
-                                "Use ONLY the provided evidence. "
-                                "Return ONLY valid JSON that matches the schema exactly. "
-                                "Never invent facts, names, dates, or timelines. "
-                                f'Use "{NOT_FOUND}" ONLY for fields that cannot be supported by evidence.'
-                            ),
-                        },
+                        {"role": "system", "content": system},
                         {"role": "user", "content": prompt},
                     ],
-                    "stream": False,
+                    "stream": True,
+                    # Pin the static system prefix in Ollama's KV cache so
+                    # repeated calls skip re-prefilling it; ~4 chars/token is
+                    # a safe underestimate of the prefix length.
+                    "options": {"num_keep": len(system) // 4},
                 },
                 timeout=timeout,
-            )
-            r.raise_for_status()
-            data = r.json()
-            return data["message"]["content"]
+                stream=True,
+            ) as r:
+                r.raise_for_status()
+                # NDJSON stream: tokens arrive as they decode, so the read
+                # timeout bounds inter-chunk gaps instead of the whole
+                # completion, and a hung generation is caught early.
+                pieces = []
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    chunk = _json_loads(line)
+                    msg = chunk.get("message")
+                    if msg and msg.get("content"):
+                        pieces.append(msg["content"])
+                    if chunk.get("done"):
+                        break
+                return "".join(pieces)
 
         except requests.exceptions.Timeout as e:
             last_error = e
-            logger.warning(f"Attempt {attempt + 1} timed out")
+            logger.warning("Attempt %d timed out", attempt + 1)
         except requests.exceptions.ConnectionError as e:
             last_error = e
-            logger.error(f"Connection error: {e}. Is Ollama running on localhost:11434?")
+            logger.error("Connection error: %s. Is Ollama running on localhost:11434?", e)
             break
         except requests.exceptions.RequestException as e:
             last_error = e
-            logger.error(f"Request failed: {e}")
+            logger.error("Request failed: %s", e)
             break
 
     raise RuntimeError(f"Failed to get response from Ollama after {max_retries} attempts: {last_error}")
 
 
+def _first_balanced_object(s: str) -> Optional[str]:
+    """
+    Return the first balanced {...} span in s, or None.
+
+    Walks the string once tracking brace depth and in-string state (including
+    escapes), so braces inside JSON strings or trailing prose/fence markers
+    cannot produce an invalid span the way a bare find/rfind slice can.
+    """
+    start = s.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_str = False
+    escaped = False
+    for i in range(start, len(s)):
+        c = s[i]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return s[start:i + 1]
+
+    return None
+
+
 def _safe_json_load(s: str) -> Optional[Dict[str, Any]]:
     if not s:
         return None
@@ -100,35 +232,69 @@ def _safe_json_load(s: str) -> Optional[Dict[str, Any]]:
     s = s.strip()
 
     try:
-        return json.loads(s)
-    except json.JSONDecodeError:
+        return _json_loads(s)
+    except ValueError:
         pass
 
-    if s.startswith("```"):
-        lines = s.split("\n")
-        if len(lines) > 2:
-            s2 = "\n".join(lines[1:-1])
-            try:
-                return json.loads(s2)
-            except json.JSONDecodeError:
-                pass
-
-    start = s.find("{")
-    end = s.rfind("}")
-    if start != -1 and end != -1 and end > start:
+    # Single-pass fallback: the balanced scan extracts the first complete
+    # object even when the model wraps it in prose or markdown fences (the
+    # scan starts at the first '{', so fence markers are skipped naturally).
+    # One O(n) walk and at most one extra parse, instead of the old
+    # fence-strip / find / rfind cascade of re-parses.
+    candidate = _first_balanced_object(s)
+    if candidate:
         try:
-            return json.loads(s[start:end + 1])
-        except json.JSONDecodeError:
+            return _json_loads(candidate)
+        except ValueError:
             pass
 
     return None
 
 
+# Structural schema for a complete deliverable; used only to detect the
+# common already-valid case cheaply, never to reject anything.
+DELIVERABLE_SCHEMA = {
+    "type": "object",
+    "required": ["executive_summary", "client_ready_email", "action_list", "sources"],
+    "properties": {
+        "executive_summary": {"type": "string"},
+        "client_ready_email": {
+            "type": "object",
+            "required": ["subject", "body"],
+        },
+        "action_list": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["action", "owner", "due_date", "confidence", "evidence_refs"],
+            },
+        },
+        "sources": {"type": "array"},
+    },
+}
+
+try:
+    # fastjsonschema compiles the schema to straight-line bytecode at import;
+    # well-formed payloads then skip the setdefault walk entirely. Optional.
+    import fastjsonschema
+
+    _VALIDATE_DELIVERABLE = fastjsonschema.compile(DELIVERABLE_SCHEMA)
+except ImportError:
+    _VALIDATE_DELIVERABLE = None
+
+
 def _ensure_schema(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Make schema robust (don’t fix truth; just enforce structure).
     Verifier will still block if evidence refs are missing/invalid.
     """
+    if _VALIDATE_DELIVERABLE is not None:
+        try:
+            _VALIDATE_DELIVERABLE(payload)
+            return payload  # already well-formed; skip the defaulting walk
+        except Exception:
+            pass  # fall through and repair field by field
+
     if "executive_summary" not in payload:
         payload["executive_summary"] = NOT_FOUND
 
@@ -156,27 +322,9 @@ def _ensure_schema(payload: Dict[str, Any]) -> Dict[str, Any]:
     return payload
 
 
-def write_deliverable(
-    user_task: str,
-    research_output: Dict[str, Any],
-    chat_model: str = DEFAULT_OLLAMA_CHAT_MODEL,
-) -> Dict[str, Any]:
-
-    if not research_output or not isinstance(research_output, dict):
-        return {"status": "error", "message": "Invalid research_output", "user_task": user_task, "deliverable": None}
-
-    if research_output.get("status") != "found":
-        return {"status": "not_found", "message": NOT_FOUND, "user_task": user_task, "deliverable": None}
-
-    evidence = research_output.get("evidence") or []
-    if not evidence:
-        return {"status": "not_found", "message": "No evidence provided in research output.", "user_task": user_task, "deliverable": None}
-
-    evidence_context = _build_evidence_context(evidence)
-    if not evidence_context:
-        return {"status": "error", "message": "Could not build evidence context.", "user_task": user_task, "deliverable": None}
-
-    prompt = f"""
+# Static portion of the writer prompt, built once at import time. Keeping it
+# byte-identical across calls also keeps the shared prefix cacheable.
+_PROMPT_HEADER = f"""
 You must write a client-ready deliverable using ONLY the EVIDENCE below.
 
 KEY RULES:
@@ -210,16 +358,41 @@ OUTPUT: Return ONLY valid JSON with this exact schema:
     }}
   ]
 }}
+""".strip()
 
-EVIDENCE:
-{evidence_context}
 
-USER TASK:
-{user_task}
-""".strip()
+def write_deliverable(
+    user_task: str,
+    research_output: Dict[str, Any],
+    chat_model: str = DEFAULT_OLLAMA_CHAT_MODEL,
+) -> Dict[str, Any]:
+
+    if not research_output or not isinstance(research_output, dict):
+        return {"status": "error", "message": "Invalid research_output", "user_task": user_task, "deliverable": None}
+
+    if research_output.get("status") != "found":
+        return {"status": "not_found", "message": NOT_FOUND, "user_task": user_task, "deliverable": None}
+
+    evidence = research_output.get("evidence") or []
+    if not evidence:
+        return {"status": "not_found", "message": "No evidence provided in research output.", "user_task": user_task, "deliverable": None}
+
+    evidence_context, citations = _build_evidence_context(evidence)
+    if not evidence_context:
+        return {"status": "error", "message": "Could not build evidence context.", "user_task": user_task, "deliverable": None}
+
+    # The static rules/schema header rides in the system message (cached as a
+    # shared prefix across calls); only the small dynamic tail goes per-call
+    prompt = "\n".join((
+        "EVIDENCE:",
+        evidence_context,
+        "",
+        "USER TASK:",
+        user_task,
+    ))
 
     try:
-        raw = _ollama_chat(prompt, model=chat_model)
+        raw = _ollama_chat(prompt, model=chat_model, system=_SYSTEM_ROLE + "\n\n" + _PROMPT_HEADER)
     except Exception as e:
         return {"status": "error", "message": f"Failed to communicate with LLM: {str(e)}", "user_task": user_task, "deliverable": None}
 
@@ -229,13 +402,11 @@ USER TASK:
 
     payload = _ensure_schema(payload)
 
-    # Build sources from the SAME evidence slice used in context
-    sources = []
-    max_items = min(8, len(evidence))
-    for i in range(1, max_items + 1):
-        e = evidence[i - 1]
-        sources.append({"evidence_ref": f"E{i}", "citation": _build_citation(e)})
-
-    payload["sources"] = sources
+    # Build sources from the SAME evidence slice used in context, reusing the
+    # citations computed during context rendering instead of re-deriving them
+    payload["sources"] = [
+        {"evidence_ref": f"E{i}", "citation": c}
+        for i, c in enumerate(citations, start=1)
+    ]
 
     return {"status": "ok", "user_task": user_task, "deliverable": payload}
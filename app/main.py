@@ -1,21 +1,110 @@
+import copy
+import functools
 import json
 import time
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-from agents.planner_agent import plan_task
+import asyncio
+
+from agents.planner_agent import aplan_task
 from agents.research_agent import EvidenceStore, ResearchAgent
 from agents.writer_agent import write_deliverable
 from agents.verifier_agent import verify_deliverable
 from retrieval.settings import CHUNKS_JSONL
 
+try:
+    import orjson
+
+    def _dumps_indented(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:  # orjson is optional; stdlib json works, just slower
+
+    def _dumps_indented(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def _ms() -> int:
-    """Get current timestamp in milliseconds."""
-    return int(time.time() * 1000)
+def _now_ns() -> int:
+    """Monotonic clock in nanoseconds; immune to NTP jumps, used for deltas only."""
+    return time.perf_counter_ns()
+
+
+# Research results are deterministic for a given store + query, so verifier
+# retries and overlapping planner questions can skip the embedding/search
+# round-trip entirely. Keyed on the store's identity since stores for
+# different chunk files must not share hits; each entry pins the store
+# object so its id can't be recycled for a different store, and hits verify
+# identity before being served (same pattern as the writer's evidence cache).
+_SEARCH_CACHE: Dict[Any, tuple] = {}
+_SEARCH_CACHE_MAX = 256
+
+
+def _search_cache_get(store: EvidenceStore, q: str) -> Optional[Dict[str, Any]]:
+    cached = _SEARCH_CACHE.get((id(store), q))
+    if cached is not None and cached[0] is store:
+        return cached[1]
+    return None
+
+
+def _search_with_cache(
+    researcher: ResearchAgent,
+    store: EvidenceStore,
+    queries: List[str],
+) -> List[Dict[str, Any]]:
+    """Batched search over queries, serving repeats from the module cache."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    pending: List[str] = []
+    pending_pos: List[int] = []
+    pending_keys = set()
+
+    for i, q in enumerate(queries):
+        key = (id(store), q)
+        cached = _search_cache_get(store, q)
+        if cached is not None:
+            # Deep copy so downstream mutation can't poison the cache
+            results[i] = copy.deepcopy(cached)
+        elif key in pending_keys:
+            continue  # duplicate within this batch; filled from cache below
+        else:
+            pending.append(q)
+            pending_pos.append(i)
+            pending_keys.add(key)
+
+    if pending:
+        for i, result in zip(pending_pos, researcher.search_batch(pending)):
+            key = (id(store), queries[i])
+            if result.get("status") != "error":
+                if len(_SEARCH_CACHE) >= _SEARCH_CACHE_MAX:
+                    _SEARCH_CACHE.clear()
+                _SEARCH_CACHE[key] = (store, copy.deepcopy(result))
+            results[i] = result
+
+    # Fill in-batch duplicates from the freshly cached entries
+    for i, q in enumerate(queries):
+        if results[i] is None:
+            cached = _search_cache_get(store, q)
+            results[i] = copy.deepcopy(cached) if cached is not None else {
+                "status": "error",
+                "message": "Duplicate query failed in batch.",
+                "evidence": [],
+            }
+
+    return results
+
+
+@functools.lru_cache(maxsize=4)
+def _get_store(path) -> EvidenceStore:
+    """
+    Load the evidence store once per path and reuse it across run() calls.
+
+    EvidenceStore is read-only after load(), so sharing one instance between
+    invocations (and threads) is safe and skips re-parsing the chunks file on
+    every workflow.
+    """
+    return EvidenceStore(path)
 
 
 def _merge_research_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -52,16 +141,26 @@ def _merge_research_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
         evidence = r.get("evidence") or []
         all_evidence.extend(evidence)
 
-    # Deduplicate by idx (in case same chunk appears in multiple searches)
-    seen_idx = set()
+    # Deduplicate on a content fingerprint rather than idx alone: items from
+    # different searches may lack idx or reuse the same slot for different
+    # documents, and duplicate text in the prompt is pure prefill cost.
+    seen = set()
     unique_evidence = []
     for ev in all_evidence:
-        idx = ev.get("idx")
-        if idx not in seen_idx:
-            seen_idx.add(idx)
+        fp = (
+            ev.get("doc_name"),
+            ev.get("page"),
+            ev.get("section"),
+            hash((ev.get("text") or "")[:200]),
+        )
+        if fp not in seen:
+            seen.add(fp)
             unique_evidence.append(ev)
 
-    logger.info(f"Merged {len(results)} research results into {len(unique_evidence)} unique evidence items")
+    logger.info(
+        "Merged %d research results into %d unique evidence items",
+        len(results), len(unique_evidence),
+    )
 
     return {
         "status": "found",
@@ -70,10 +169,15 @@ def _merge_research_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
     }
 
 
-def run(user_task: str) -> Dict[str, Any]:
+async def run_async(user_task: str) -> Dict[str, Any]:
     """
     Execute the multi-agent workflow: Plan → Research → Draft → Verify → Deliver
 
+    The pipeline is I/O-bound (embedding, search and Ollama calls), so the
+    async form lets a server overlap multiple workflows per process; the
+    blocking research/writer stages run in worker threads via
+    ``asyncio.to_thread`` so their caching and retry behavior is unchanged.
+
     Args:
         user_task: Natural language task from user
 
@@ -89,90 +193,90 @@ def run(user_task: str) -> Dict[str, Any]:
             "total_ms": 0,
         }
 
-    logger.info(f"Starting workflow for task: {user_task[:100]}...")
+    # %.100s defers the slice to the formatter, so it never runs when INFO is off
+    logger.info("Starting workflow for task: %.100s...", user_task)
 
     trace = []
-    t0 = _ms()
+    t0 = _now_ns()
 
     # ===== STEP 1: PLAN =====
     logger.info("Step 1/4: Planning...")
-    s = _ms()
+    s = _now_ns()
 
     try:
-        planner_out = plan_task(user_task)
+        planner_out = await aplan_task(user_task)
     except Exception as e:
-        logger.error(f"Planner failed: {e}")
+        logger.error("Planner failed: %s", e)
         trace.append({
             "agent": "planner",
             "status": "error",
-            "duration_ms": _ms() - s,
+            "duration_ms": (_now_ns() - s) // 1_000_000,
             "error": str(e),
         })
         return {
             "status": "error",
             "message": f"Planner failed: {str(e)}",
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     trace.append({
         "agent": "planner",
         "status": planner_out.get("status"),
-        "duration_ms": _ms() - s,
+        "duration_ms": (_now_ns() - s) // 1_000_000,
     })
 
     if planner_out.get("status") != "ok":
-        logger.error(f"Planner returned non-ok status: {planner_out.get('status')}")
+        logger.error("Planner returned non-ok status: %s", planner_out.get("status"))
         return {
             "status": "error",
             "message": planner_out.get("message", "Planning failed"),
             "planner_output": planner_out,
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     plan = planner_out.get("plan", {})
     research_questions = plan.get("research_questions") or [user_task]
 
-    logger.info(f"Plan created with {len(research_questions)} research question(s)")
+    logger.info("Plan created with %d research question(s)", len(research_questions))
 
     # ===== STEP 2: RESEARCH =====
     logger.info("Step 2/4: Researching...")
-    s = _ms()
+    s = _now_ns()
 
     try:
-        store = EvidenceStore(CHUNKS_JSONL)
+        store = _get_store(CHUNKS_JSONL)
     except Exception as e:
-        logger.error(f"Failed to initialize evidence store: {e}")
+        logger.error("Failed to initialize evidence store: %s", e)
         trace.append({
             "agent": "research",
             "status": "error",
-            "duration_ms": _ms() - s,
+            "duration_ms": (_now_ns() - s) // 1_000_000,
             "error": str(e),
         })
         return {
             "status": "error",
             "message": f"Failed to load evidence store: {str(e)}",
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     researcher = ResearchAgent(store=store)
 
-    # Execute research queries (support multiple questions)
-    research_results = []
-    for i, query in enumerate(research_questions[:3], start=1):  # Limit to 3 queries
-        logger.info(f"Research query {i}/{min(len(research_questions), 3)}: {query[:50]}...")
-        try:
-            result = researcher.search(query)
-            research_results.append(result)
-        except Exception as e:
-            logger.error(f"Research query {i} failed: {e}")
-            research_results.append({
-                "status": "error",
-                "message": str(e),
-                "evidence": [],
-            })
+    # Execute research queries (support multiple questions). The queries are
+    # independent, so run them as one batch: a single embedding pass and one
+    # index search makes research latency max-of-N instead of sum-of-N.
+    queries = research_questions[:3]  # Limit to 3 queries
+    logger.info("Research queries: %d", len(queries))
+    try:
+        research_results = await asyncio.to_thread(_search_with_cache, researcher, store, queries)
+    except Exception as e:
+        logger.error("Research batch failed: %s", e)
+        research_results = [
+            {"status": "error", "message": str(e), "evidence": []}
+            for _ in queries
+        ]
 
     # Merge results
     research_out = _merge_research_results(research_results)
@@ -180,7 +284,7 @@ def run(user_task: str) -> Dict[str, Any]:
     trace.append({
         "agent": "research",
         "status": research_out.get("status"),
-        "duration_ms": _ms() - s,
+        "duration_ms": (_now_ns() - s) // 1_000_000,
         "queries": research_questions[:3],
         "evidence_count": len(research_out.get("evidence") or []),
     })
@@ -201,72 +305,72 @@ def run(user_task: str) -> Dict[str, Any]:
                 "sources": [],
             },
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     # ===== STEP 3: DRAFT (WRITER) =====
     logger.info("Step 3/4: Writing deliverable...")
-    s = _ms()
+    s = _now_ns()
 
     try:
-        writer_out = write_deliverable(user_task, research_out)
+        writer_out = await asyncio.to_thread(write_deliverable, user_task, research_out)
     except Exception as e:
-        logger.error(f"Writer failed: {e}")
+        logger.error("Writer failed: %s", e)
         trace.append({
             "agent": "writer",
             "status": "error",
-            "duration_ms": _ms() - s,
+            "duration_ms": (_now_ns() - s) // 1_000_000,
             "error": str(e),
         })
         return {
             "status": "error",
             "message": f"Writer failed: {str(e)}",
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     trace.append({
         "agent": "writer",
         "status": writer_out.get("status"),
-        "duration_ms": _ms() - s,
+        "duration_ms": (_now_ns() - s) // 1_000_000,
     })
 
     if writer_out.get("status") != "ok":
-        logger.error(f"Writer returned non-ok status: {writer_out.get('status')}")
+        logger.error("Writer returned non-ok status: %s", writer_out.get("status"))
         return {
             "status": "error",
             "message": writer_out.get("message", "Writing failed"),
             "writer_output": writer_out,
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     # ===== STEP 4: VERIFY =====
     logger.info("Step 4/4: Verifying deliverable...")
-    s = _ms()
+    s = _now_ns()
 
     try:
         verified = verify_deliverable(writer_out, research_out)
     except Exception as e:
-        logger.error(f"Verifier failed: {e}")
+        logger.error("Verifier failed: %s", e)
         trace.append({
             "agent": "verifier",
             "status": "error",
-            "duration_ms": _ms() - s,
+            "duration_ms": (_now_ns() - s) // 1_000_000,
             "error": str(e),
         })
         return {
             "status": "error",
             "message": f"Verifier failed: {str(e)}",
             "trace": trace,
-            "total_ms": _ms() - t0,
+            "total_ms": (_now_ns() - t0) // 1_000_000,
         }
 
     issues = verified.get("issues") or []
     trace.append({
         "agent": "verifier",
         "status": verified.get("status"),
-        "duration_ms": _ms() - s,
+        "duration_ms": (_now_ns() - s) // 1_000_000,
         "issues_count": len(issues),
         "issues": issues if issues else None,  # Include issues for debugging
     })
@@ -274,8 +378,8 @@ def run(user_task: str) -> Dict[str, Any]:
     # Determine final status
     final_status = "ok" if verified.get("status") == "ok" else "blocked"
 
-    total_time = _ms() - t0
-    logger.info(f"Workflow complete: {final_status} ({total_time}ms)")
+    total_time = (_now_ns() - t0) // 1_000_000
+    logger.info("Workflow complete: %s (%dms)", final_status, total_time)
 
     return {
         "status": final_status,
@@ -286,6 +390,11 @@ def run(user_task: str) -> Dict[str, Any]:
     }
 
 
+def run(user_task: str) -> Dict[str, Any]:
+    """Synchronous entry point; thin wrapper over run_async for existing callers."""
+    return asyncio.run(run_async(user_task))
+
+
 if __name__ == "__main__":
     import sys
 
@@ -304,7 +413,7 @@ if __name__ == "__main__":
         print("\n" + "=" * 60)
         print("WORKFLOW OUTPUT")
         print("=" * 60)
-        print(json.dumps(out, ensure_ascii=False, indent=2))
+        print(_dumps_indented(out))
 
         # Print summary
         print("\n" + "=" * 60)
@@ -332,7 +441,7 @@ if __name__ == "__main__":
         print("\n\nInterrupted by user")
         sys.exit(0)
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
+        logger.error("Fatal error: %s", e)
         import traceback
 
         traceback.print_exc()
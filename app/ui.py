@@ -1,4 +1,6 @@
+import asyncio
 import os
+import re
 import sys
 import json
 import time
@@ -12,16 +14,32 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from app.main import run
+from app.main import run, run_async
 
 # Configuration
 QUESTIONS_PATH = Path(PROJECT_ROOT) / "eval" / "questions.jsonl"
 OUT_DIR = Path(PROJECT_ROOT) / "eval" / "results"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+try:
+    import orjson
 
+    def _json_dumpb(obj: Any, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:  # orjson is optional; stdlib json works, just slower
+
+    def _json_dumpb(obj: Any, indent: bool = False) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+@st.cache_data(ttl=60)
 def load_questions() -> List[Dict[str, Any]]:
-    """Load evaluation questions from JSONL file."""
+    """Load evaluation questions from JSONL file.
+
+    Cached for a minute: Streamlit reruns the whole script on every widget
+    interaction, and re-parsing the JSONL each time is wasted work. Edits to
+    questions.jsonl are picked up when the TTL expires.
+    """
     if not QUESTIONS_PATH.exists():
         return []
 
@@ -42,6 +60,31 @@ def load_questions() -> List[Dict[str, Any]]:
     return qs
 
 
+@st.cache_data(show_spinner=False, max_entries=128)
+def cached_run(task: str) -> Dict[str, Any]:
+    """Memoized workflow execution: repeating an identical prompt (or a rerun
+    triggered by a display toggle) returns the stored result instead of
+    re-running the whole agent pipeline."""
+    return run(task)
+
+
+# Streamlit reruns the whole script per widget click; build these once
+_STATUS_EMOJI = {
+    "ok": "✅",
+    "found": "✅",
+    "not_found": "⚠️",
+    "blocked": "🚫",
+    "error": "❌",
+}
+_STATUS_COLOR = {
+    "ok": "🟢",
+    "blocked": "🟡",
+    "not_found": "⚠️",
+    "error": "🔴",
+}
+_CONFIDENCE_EMOJI = {"high": "🟢", "medium": "🟡", "low": "🔴"}
+
+
 def has_citations(result: Optional[Dict[str, Any]]) -> bool:
     """Check if result contains valid citations."""
     if not result:
@@ -50,18 +93,23 @@ def has_citations(result: Optional[Dict[str, Any]]) -> bool:
     return isinstance(sources, list) and len(sources) > 0
 
 
+_NFS_RE = re.compile(r"not found in sources", re.IGNORECASE)
+
+
 def says_not_found(result: Optional[Dict[str, Any]]) -> bool:
     """Check if result explicitly says 'not found in sources'."""
     if not result:
         return False
 
-    r = result
-    es = (r.get("executive_summary") or "").lower()
-    email = r.get("client_ready_email") or {}
-    subj = (email.get("subject") or "").lower()
-    body = (email.get("body") or "").lower()
-
-    return "not found in sources" in es or "not found in sources" in subj or "not found in sources" in body
+    email = result.get("client_ready_email") or {}
+    # One case-insensitive scan over the joined fields instead of three
+    # .lower() copies and three substring searches
+    haystack = "\n".join((
+        result.get("executive_summary") or "",
+        email.get("subject") or "",
+        email.get("body") or "",
+    ))
+    return _NFS_RE.search(haystack) is not None
 
 
 def trace_visible(out: Dict[str, Any]) -> bool:
@@ -81,14 +129,21 @@ def exec_summary_ok(result: Optional[Dict[str, Any]]) -> bool:
     if not es:
         return False
 
-    word_count = len(es.split())
-    return word_count <= 150
+    # maxsplit caps the work: 150 words produce 150 parts, 151+ words produce
+    # 151 parts with the tail left unsplit, so this never tokenizes more than
+    # the limit regardless of summary length
+    return len(es.split(None, 150)) <= 150
 
 
-def run_eval() -> tuple[int, List[Dict[str, Any]], str]:
+def run_eval(resume: bool = True) -> tuple[int, List[Dict[str, Any]], str]:
     """
     Run evaluation on all questions in eval/questions.jsonl.
 
+    With resume=True, questions whose output file already exists (and is
+    newer than questions.jsonl) reuse the saved result instead of re-running
+    the agent pipeline — re-running after one failing question costs one
+    workflow, not N.
+
     Returns:
         (failures_count, summary_list, report_path)
     """
@@ -98,75 +153,145 @@ def run_eval() -> tuple[int, List[Dict[str, Any]], str]:
         st.error("No questions to evaluate")
         return 0, [], ""
 
-    summary = []
+    summary: List[Optional[Dict[str, Any]]] = [None] * len(qs)
     failures = 0
 
     progress = st.progress(0)
     status_box = st.empty()
 
-    for i, q in enumerate(qs, start=1):
-        question_id = q.get("id", f"q_{i}")
-        task = q.get("task", "")
+    # Per-question records stream to a JSONL file as they complete, so a
+    # crashed or interrupted eval still leaves a usable partial log; the
+    # consolidated summary.json is written once at the end.
+    summary_jsonl = open(OUT_DIR / "summary.jsonl", "wb")
+
+    async def _drive():
+        nonlocal failures
+        # Workers push completions onto a queue; the driver updates the UI
+        # the moment each result lands instead of at the slowest question's
+        # cadence. Streamlit calls stay in this (main) coroutine only.
+        queue: asyncio.Queue = asyncio.Queue()
+        sem = asyncio.Semaphore(4)
+
+        async def worker(i: int, q: Dict[str, Any]):
+            question_id = q.get("id", f"q_{i + 1}")
+            task = q.get("task", "")
+            out_path = OUT_DIR / f"{question_id}.json"
+
+            # Resume path: reuse a saved result if it postdates the questions file
+            out = None
+            cached = False
+            if resume and out_path.exists():
+                try:
+                    if out_path.stat().st_mtime >= QUESTIONS_PATH.stat().st_mtime:
+                        out = json.loads(out_path.read_bytes())
+                        cached = True
+                except Exception:
+                    out = None  # unreadable cache; fall through and re-run
+
+            write_error = None
+            if cached:
+                sec = 0.0
+                error = None
+            else:
+                async with sem:
+                    t0 = time.time()
+                    error = None
+                    try:
+                        out = await run_async(task)
+                    except Exception as e:
+                        error = str(e)
+                        out = {
+                            "status": "error",
+                            "message": str(e),
+                            "result": None,
+                            "trace": []
+                        }
+                    sec = round(time.time() - t0, 2)
+
+                # Save output
+                try:
+                    # Compact form: the formatter cost and ~30% size of
+                    # indent=2 buys nothing for machine-read files
+                    out_path.write_bytes(_json_dumpb(out))
+                except Exception as e:
+                    write_error = str(e)  # driver surfaces this; no st calls here
+
+            await queue.put((i, question_id, task, out_path, out, sec, cached, error, write_error))
 
-        status_box.write(f"Running {question_id} ({i}/{len(qs)})...")
+        tasks = [asyncio.create_task(worker(i, q)) for i, q in enumerate(qs)]
 
-        t0 = time.time()
-        try:
-            out = run(task)
-        except Exception as e:
-            st.error(f"Error running {question_id}: {e}")
-            out = {
-                "status": "error",
-                "message": str(e),
-                "result": None,
-                "trace": []
+        for done in range(1, len(qs) + 1):
+            i, question_id, task, out_path, out, sec, cached, error, write_error = await queue.get()
+
+            if error:
+                st.error(f"Error running {question_id}: {error}")
+            if write_error:
+                st.warning(f"Failed to save output for {question_id}: {write_error}")
+
+            # Run checks
+            result = out.get("result") or {}
+            checks = {
+                "trace_visible": trace_visible(out),
+                "exec_summary_le_150_words": exec_summary_ok(result),
+                "has_citations_or_not_found": (has_citations(result) or says_not_found(result)),
+                "status_ok_or_blocked": out.get("status") in {"ok", "blocked"},
             }
 
-        sec = round(time.time() - t0, 2)
+            passed = all(checks.values())
+            if not passed:
+                failures += 1
+
+            record = {
+                "id": question_id,
+                "task": task,  # Store full task, not truncated
+                "seconds": sec,
+                "pass": passed,
+                "status": out.get("status"),
+                "checks": checks,
+                "output_file": str(out_path),
+            }
+            # Keep the full output in memory for the render loop (underscore
+            # keys, stripped before the record hits disk) so rendering never
+            # re-reads and re-parses files written seconds earlier. Results
+            # are immutable once written, so derived values computed here
+            # never need recomputing on reruns.
+            result_obj = out.get("result") or {}
+            summary[i] = {
+                **record,
+                "_out": out,
+                "_derived": {
+                    "trace_len": len(out.get("trace") or []),
+                    "source_count": len(result_obj.get("sources") or []),
+                },
+            }
 
-        # Save output
-        out_path = OUT_DIR / f"{question_id}.json"
-        try:
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(out, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            st.warning(f"Failed to save output for {question_id}: {e}")
-
-        # Run checks
-        result = out.get("result") or {}
-        checks = {
-            "trace_visible": trace_visible(out),
-            "exec_summary_le_150_words": exec_summary_ok(result),
-            "has_citations_or_not_found": (has_citations(result) or says_not_found(result)),
-            "status_ok_or_blocked": out.get("status") in {"ok", "blocked"},
-        }
-
-        passed = all(checks.values())
-        if not passed:
-            failures += 1
-
-        summary.append({
-            "id": question_id,
-            "task": task,  # Store full task, not truncated
-            "seconds": sec,
-            "pass": passed,
-            "status": out.get("status"),
-            "checks": checks,
-            "output_file": str(out_path),
-        })
+            try:
+                summary_jsonl.write(_json_dumpb(record) + b"\n")
+                summary_jsonl.flush()
+            except Exception as e:
+                st.warning(f"Failed to append summary record for {question_id}: {e}")
+
+            verb = "Reused cached" if cached else "Finished"
+            status_box.write(f"{verb} {question_id} ({done}/{len(qs)})...")
+            progress.progress(done / len(qs))
 
-        progress.progress(i / len(qs))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_drive())
+    summary_jsonl.close()
 
     # Save summary report
     report_path = OUT_DIR / "summary.json"
     try:
-        with open(report_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "failures": failures,
-                "total": len(qs),
-                "pass_rate": f"{((len(qs) - failures) / len(qs) * 100):.1f}%",
-                "summary": summary
-            }, f, ensure_ascii=False, indent=2)
+        report_path.write_bytes(_json_dumpb({
+            "failures": failures,
+            "total": len(qs),
+            "pass_rate": f"{((len(qs) - failures) / len(qs) * 100):.1f}%",
+            "summary": [
+                {k: v for k, v in item.items() if not k.startswith("_")}
+                for item in summary
+            ],
+        }, indent=True))
     except Exception as e:
         st.error(f"Failed to save summary report: {e}")
         report_path = OUT_DIR / "summary_failed.json"
@@ -226,7 +351,7 @@ def render_deliverable(result: Dict[str, Any]) -> None:
                     st.write(f"**Due date:** {a.get('due_date', 'Not specified')}")
                 with col3:
                     confidence = a.get('confidence', 'unknown')
-                    emoji = {"high": "🟢", "medium": "🟡", "low": "🔴"}.get(confidence.lower(), "⚪")
+                    emoji = _CONFIDENCE_EMOJI.get(confidence.lower(), "⚪")
                     st.write(f"**Confidence:** {emoji} {confidence}")
 
                 refs = a.get('evidence_refs', [])
@@ -247,6 +372,22 @@ def render_deliverable(result: Dict[str, Any]) -> None:
                 st.markdown(f"**{ref}:** {citation}")
 
 
+def _compact(obj: Any, maxlen: int = 2000) -> Any:
+    """Bound what a trace entry ships to the browser: long strings are cut
+    with an elision marker and oversized lists are truncated, recursively."""
+    if isinstance(obj, str):
+        if len(obj) > maxlen:
+            return obj[:maxlen] + f"…<{len(obj) - maxlen} more chars>"
+        return obj
+    if isinstance(obj, list):
+        if len(obj) > 50:
+            return [_compact(v, maxlen) for v in obj[:50]] + [f"…<{len(obj) - 50} more items>"]
+        return [_compact(v, maxlen) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _compact(v, maxlen) for k, v in obj.items()}
+    return obj
+
+
 def render_trace(trace: List[Dict[str, Any]]) -> None:
     """Render agent trace log in a readable format."""
     if not trace:
@@ -258,17 +399,10 @@ def render_trace(trace: List[Dict[str, Any]]) -> None:
         status = entry.get("status", "unknown")
         duration_ms = entry.get("duration_ms", 0)
 
-        # Status emoji
-        status_emoji = {
-            "ok": "✅",
-            "found": "✅",
-            "not_found": "⚠️",
-            "blocked": "🚫",
-            "error": "❌"
-        }.get(status, "⚪")
+        status_emoji = _STATUS_EMOJI.get(status, "⚪")
 
         with st.expander(f"{status_emoji} Step {i}: {agent} ({status}, {duration_ms}ms)", expanded=False):
-            st.json(entry)
+            st.json(_compact(entry))
 
 
 # ===== STREAMLIT UI =====
@@ -326,7 +460,7 @@ if mode.startswith("💬"):  # Chat mode
             with st.spinner("🤖 Running multi-agent workflow..."):
                 try:
                     t0 = time.time()
-                    out = run(prompt)
+                    out = cached_run(prompt)
                     elapsed_ms = int((time.time() - t0) * 1000)
                 except Exception as e:
                     st.error(f"❌ Error: {e}")
@@ -338,12 +472,7 @@ if mode.startswith("💬"):  # Chat mode
 
             # Display status
             status = out.get("status", "unknown")
-            status_color = {
-                "ok": "🟢",
-                "blocked": "🟡",
-                "not_found": "⚠️",
-                "error": "🔴"
-            }.get(status, "⚪")
+            status_color = _STATUS_COLOR.get(status, "⚪")
 
             st.markdown(f"**Status:** {status_color} {status}")
 
@@ -370,11 +499,12 @@ if mode.startswith("💬"):  # Chat mode
             runtime_ms = out.get("total_ms", elapsed_ms)
             st.markdown(f"**⏱️ Runtime:** {runtime_ms} ms ({runtime_ms / 1000:.2f}s)")
 
-            # Show raw JSON
+            # Show raw JSON; collapsed expander + lazy st.json keeps the
+            # server from serializing the whole payload unless it's opened
             if show_raw:
                 st.markdown("---")
-                st.markdown("### 🔧 Raw JSON Output")
-                st.json(out)
+                with st.expander("🔧 Raw JSON Output", expanded=False):
+                    st.json(out, expanded=False)
 
         # Add assistant response to history
         st.session_state.messages.append({
@@ -413,10 +543,12 @@ else:  # Eval mode
                 if i < len(questions):
                     st.markdown("---")
 
+    resume = st.checkbox("Resume (skip cached results)", value=True)
+
     # Run button
     if st.button("▶️ Run evaluation now", type="primary", disabled=len(questions) == 0):
         with st.spinner("Running evaluation..."):
-            failures, summary, report_path = run_eval()
+            failures, summary, report_path = run_eval(resume=resume)
 
         # Display results
         st.markdown("---")
@@ -457,15 +589,23 @@ else:  # Eval mode
                 st.markdown("---")
                 st.markdown("#### 📄 Deliverable")
                 try:
-                    with open(item['output_file'], 'r') as f:
-                        full_output = json.load(f)
+                    # In-memory fast path; fall back to disk only if the
+                    # summary came from somewhere other than this eval run
+                    full_output = item.get("_out")
+                    if full_output is None:
+                        with open(item['output_file'], 'r') as f:
+                            full_output = json.load(f)
 
                     result = full_output.get("result", {})
                     if result:
                         render_deliverable(result)
 
-                        # Show trace if available
-                        if show_trace and trace_visible(full_output):
+                        # Show trace if available (precomputed at eval time)
+                        derived = item.get("_derived") or {}
+                        trace_len = derived.get("trace_len")
+                        if trace_len is None:
+                            trace_len = len(full_output.get("trace") or [])
+                        if show_trace and trace_len:
                             st.markdown("---")
                             st.markdown("#### 🔍 Agent Trace")
                             render_trace(full_output.get("trace", []))
@@ -473,8 +613,8 @@ else:  # Eval mode
                         # Show raw JSON if requested
                         if show_raw:
                             st.markdown("---")
-                            st.markdown("#### 🔧 Raw JSON")
-                            st.json(full_output)
+                            with st.expander("🔧 Raw JSON", expanded=False):
+                                st.json(full_output, expanded=False)
                     else:
                         st.warning("No deliverable in output")
 
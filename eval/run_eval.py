@@ -5,46 +5,74 @@ CLI Evaluation Runner for Enterprise Multi-Agent Copilot
 Runs all questions in questions.jsonl and generates a detailed report.
 """
 
+import asyncio
 import json
+import os
+import re
+import sqlite3
 import time
 import sys
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, Iterator, List, Tuple, Optional
 
-from app.main import run
+from app.main import run_async
 
 # Configuration
 QUESTIONS_PATH = Path(__file__).parent / "questions.jsonl"
 OUT_DIR = Path(__file__).parent / "results"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Max questions in flight at once; unbounded gather invites 429s / thread
+# exhaustion on large question sets
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "10"))
+
+try:
+    import orjson
+
+    def _json_dumpb(obj: Any, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:  # orjson is optional; stdlib json works, just slower
+
+    def _json_dumpb(obj: Any, indent: bool = False) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def iter_questions() -> "Iterator[Dict[str, Any]]":
+    """Yield validated questions one line at a time, never holding the raw
+    file in memory; malformed or incomplete lines are skipped with a warning."""
+    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                q = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"WARNING: Line {line_num} malformed JSON: {e}, skipping")
+                continue
+            # Validate required fields
+            if "id" not in q:
+                print(f"WARNING: Line {line_num} missing 'id', skipping")
+                continue
+            if "task" not in q:
+                print(f"WARNING: Line {line_num} missing 'task', skipping")
+                continue
+            yield q
+
 
 def load_questions() -> List[Dict[str, Any]]:
-    """Load evaluation questions from JSONL file with validation."""
+    """Load evaluation questions from JSONL file with validation.
+
+    The concurrent dispatcher needs the full set up front, so this simply
+    drains iter_questions(); callers that can stream should use the iterator
+    directly.
+    """
     if not QUESTIONS_PATH.exists():
         print(f"ERROR: Questions file not found: {QUESTIONS_PATH}")
         sys.exit(1)
 
-    qs = []
     try:
-        with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, start=1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    q = json.loads(line)
-                    # Validate required fields
-                    if "id" not in q:
-                        print(f"WARNING: Line {line_num} missing 'id', skipping")
-                        continue
-                    if "task" not in q:
-                        print(f"WARNING: Line {line_num} missing 'task', skipping")
-                        continue
-                    qs.append(q)
-                except json.JSONDecodeError as e:
-                    print(f"WARNING: Line {line_num} malformed JSON: {e}, skipping")
-                    continue
+        qs = list(iter_questions())
     except Exception as e:
         print(f"ERROR: Failed to load questions: {e}")
         sys.exit(1)
@@ -64,15 +92,22 @@ def has_citations(result: Dict[str, Any]) -> bool:
     return isinstance(sources, list) and len(sources) > 0
 
 
+_NFS_RE = re.compile(r"not found in sources", re.IGNORECASE)
+
+
 def says_not_found(result: Dict[str, Any]) -> bool:
     """Check if result explicitly says 'not found in sources'."""
     if not result:
         return False
-    es = (result.get("executive_summary") or "").strip().lower()
     email = result.get("client_ready_email") or {}
-    subj = (email.get("subject") or "").strip().lower()
-    body = (email.get("body") or "").strip().lower()
-    return "not found in sources" in es or "not found in sources" in subj or "not found in sources" in body
+    # One case-insensitive scan over the joined fields instead of three
+    # .lower() copies and three substring searches
+    haystack = "\n".join((
+        result.get("executive_summary") or "",
+        email.get("subject") or "",
+        email.get("body") or "",
+    ))
+    return _NFS_RE.search(haystack) is not None
 
 
 def trace_visible(out: Dict[str, Any]) -> bool:
@@ -88,8 +123,9 @@ def executive_summary_word_count_ok(result: Dict[str, Any]) -> bool:
     es = (result.get("executive_summary") or "").strip()
     if not es:
         return False
-    word_count = len(es.split())
-    return word_count <= 150
+    # maxsplit caps the work: 151+ words produce 151 parts with the tail left
+    # unsplit, so this never tokenizes more than the limit
+    return len(es.split(None, 150)) <= 150
 
 
 def print_divider(char="=", length=80):
@@ -146,7 +182,18 @@ def print_result_details(result: Dict[str, Any], indent=2):
         print()
 
 
-def evaluate_one(q: Dict[str, Any], verbose: bool = True) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+def compute_checks(out: Dict[str, Any]) -> Dict[str, bool]:
+    """Run the standard acceptance checks against a workflow output."""
+    result = out.get("result") or {}
+    return {
+        "trace_visible": trace_visible(out),
+        "exec_summary_le_150_words": executive_summary_word_count_ok(result),
+        "has_citations_or_not_found": (has_citations(result) or says_not_found(result)),
+        "status_ok_or_blocked": out.get("status") in {"ok", "blocked"},
+    }
+
+
+async def evaluate_one(q: Dict[str, Any], verbose: bool = True) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
     """
     Evaluate a single question.
 
@@ -156,7 +203,7 @@ def evaluate_one(q: Dict[str, Any], verbose: bool = True) -> Tuple[Optional[Dict
     t0 = time.time()
 
     try:
-        out = run(q["task"])
+        out = await run_async(q["task"])
     except Exception as e:
         elapsed = time.time() - t0
         if verbose:
@@ -175,19 +222,11 @@ def evaluate_one(q: Dict[str, Any], verbose: bool = True) -> Tuple[Optional[Dict
 
     elapsed = time.time() - t0
 
-    result = out.get("result") or {}
-    checks = {
-        "trace_visible": trace_visible(out),
-        "exec_summary_le_150_words": executive_summary_word_count_ok(result),
-        "has_citations_or_not_found": (has_citations(result) or says_not_found(result)),
-        "status_ok_or_blocked": out.get("status") in {"ok", "blocked"},
-    }
-
     return out, {
         "id": q["id"],
         "seconds": round(elapsed, 2),
         "status": out.get("status"),
-        "checks": checks
+        "checks": compute_checks(out),
     }
 
 
@@ -207,16 +246,87 @@ def main():
     print(f"💾 Output directory: {OUT_DIR}")
     print()
 
-    # Run evaluation
+    # Run evaluation: the questions are independent and the workflow is
+    # I/O-bound on LLM/embedding calls, so dispatch them all concurrently and
+    # report in input order once everything lands. Wall time becomes roughly
+    # max-of-N instead of sum-of-N.
     print("🚀 Running evaluation...")
     print_divider("-")
 
+    db_path = OUT_DIR / "results.db"
+
+    # Resume support: unless --force is given, reuse outputs from a prior run
+    # whose database postdates the questions file.
+    force_rerun = "--force" in sys.argv[1:]
+    cached_outs: Dict[str, Dict[str, Any]] = {}
+    if not force_rerun and db_path.exists() and db_path.stat().st_mtime >= QUESTIONS_PATH.stat().st_mtime:
+        try:
+            with sqlite3.connect(db_path) as c:
+                cached_outs = {
+                    qid: json.loads(blob)
+                    for qid, blob in c.execute("SELECT id, out FROM results")
+                }
+        except Exception as e:
+            print(f"  ⚠️  WARNING: Ignoring unreadable results cache: {e}")
+            cached_outs = {}
+        else:
+            # Drop error placeholders so failed questions are retried
+            cached_outs = {qid: o for qid, o in cached_outs.items() if "error" not in o}
+            if cached_outs:
+                print(f"♻️  Reusing {len(cached_outs)} cached result(s); pass --force to re-run all")
+
+    async def _gather_all():
+        # Semaphore keeps a steady EVAL_CONCURRENCY requests in flight: a new
+        # question starts the moment one finishes, throughput stays maximal
+        # and memory/provider load stays bounded.
+        sem = asyncio.Semaphore(EVAL_CONCURRENCY)
+
+        async def _one(i: int, q: Dict[str, Any]):
+            cached = cached_outs.get(q["id"])
+            if cached is not None:
+                info = {
+                    "id": q["id"],
+                    "seconds": 0.0,
+                    "status": cached.get("status"),
+                    "checks": compute_checks(cached),
+                    "cached": True,
+                }
+                return i, (cached, info)
+            async with sem:
+                for attempt in range(3):
+                    try:
+                        return i, await evaluate_one(q, verbose=False)
+                    except Exception:
+                        if attempt == 2:
+                            raise
+                        await asyncio.sleep(0.5 * (2 ** attempt))
+
+        results: List[Optional[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]] = [None] * len(questions)
+        done = 0
+        # as_completed lets us report progress as results land, out of order
+        for fut in asyncio.as_completed([_one(i, q) for i, q in enumerate(questions)]):
+            i, res = await fut
+            results[i] = res
+            done += 1
+            print(f"  ✓ {questions[i]['id']} done ({done}/{len(questions)})")
+        return results
+
+    results = asyncio.run(_gather_all())
+
+    # One SQLite file instead of N small JSON files: a single batched insert
+    # and commit replaces N open/write/close/fsync cycles, which dominate on
+    # network filesystems, while keeping random access by question id
+    # (SELECT out FROM results WHERE id=?).
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, out BLOB)")
+    pending_rows = []
+
     summary = []
     failures = 0
     errors = 0
     total_time = 0
 
-    for i, q in enumerate(questions, start=1):
+    for i, (q, (out, info)) in enumerate(zip(questions, results), start=1):
         qid = q["id"]
         task = q["task"]
 
@@ -228,23 +338,13 @@ def main():
         print(f"📝 TASK:")
         print(f"   {task}")
         print()
-        print(f"⏳ Running workflow...")
-
-        out, info = evaluate_one(q, verbose=True)
 
         # Save output (even if there was an error)
-        out_path = OUT_DIR / f"{qid}.json"
-        try:
-            with open(out_path, "w", encoding="utf-8") as f:
-                if out:
-                    json.dump(out, f, ensure_ascii=False, indent=2)
-                else:
-                    json.dump({"error": info.get("error")}, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"  ⚠️  WARNING: Failed to save output: {e}")
+        pending_rows.append((qid, _json_dumpb(out if out else {"error": info.get("error")})))
 
         # Check if passed
         if out is None:
+            print(f"  ❌ ERROR: {info.get('error')}")
             errors += 1
             ok = False
         else:
@@ -262,7 +362,7 @@ def main():
             "status": info.get("status"),
             "pass": ok,
             "checks": info["checks"],
-            "output_file": str(out_path),
+            "output_db": str(db_path),
         })
 
         # Print result
@@ -298,6 +398,15 @@ def main():
     print_divider("=")
     print()
 
+    try:
+        conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?)", pending_rows)
+        conn.commit()
+        print(f"✓ Outputs saved to: {db_path}")
+    except Exception as e:
+        print(f"  ⚠️  WARNING: Failed to save outputs: {e}")
+    finally:
+        conn.close()
+
     # Save summary report
     report_path = OUT_DIR / "summary.json"
     try:
@@ -315,8 +424,7 @@ def main():
             "summary": summary
         }
 
-        with open(report_path, "w", encoding="utf-8") as f:
-            json.dump(report_data, f, ensure_ascii=False, indent=2)
+        report_path.write_bytes(_json_dumpb(report_data, indent=True))
 
         print(f"✓ Report saved to: {report_path}")
     except Exception as e:
@@ -1,5 +1,8 @@
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import List
 
 from pypdf import PdfReader
 
@@ -10,9 +13,44 @@ from settings import (
     CHUNKS_JSONL,
     CHUNK_MAX_TOKENS,
     CHUNK_TOKEN_OVERLAP,
+    PDF_BACKEND,
 )
 
+if PDF_BACKEND == "fitz":
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        fitz = None
+else:
+    fitz = None
+
+try:
+    import orjson
+
+    def _json_dumpb(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # orjson is optional; stdlib json works, just slower
+
+    def _json_dumpb(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Per-process tokenizer, loaded lazily in each pool worker so it is never
+# pickled across the process boundary.
+_TOKENIZER = None
+
+
 def extract_pages(pdf_path: Path):
+    if fitz is not None:
+        doc = fitz.open(str(pdf_path))
+        try:
+            for i, page in enumerate(doc, start=1):
+                text = page.get_text("text")
+                if text:
+                    yield i, text
+        finally:
+            doc.close()
+        return
+
     reader = PdfReader(str(pdf_path))
     for i, page in enumerate(reader.pages, start=1):
         text = page.extract_text()
@@ -20,36 +58,54 @@ def extract_pages(pdf_path: Path):
             yield i, text
 
 
+def process_pdf(pdf_path: Path) -> List[dict]:
+    """
+    Extracts and chunks one PDF. PDFs are independent, so this is the unit
+    of work handed to each pool worker.
+    """
+    global _TOKENIZER
+    if _TOKENIZER is None:
+        _TOKENIZER = load_tokenizer()
+
+    doc_name = pdf_path.stem
+    rows = []
+
+    for page_num, page_text in extract_pages(pdf_path):
+        chunks = dynamic_chunk_page(
+            tokenizer=_TOKENIZER,
+            doc_name=doc_name,
+            page_num=page_num,
+            page_text=page_text,
+            max_tokens=CHUNK_MAX_TOKENS,
+            overlap=CHUNK_TOKEN_OVERLAP,
+        )
+
+        for c in chunks:
+            rows.append({
+                "text": c.text,
+                "metadata": c.metadata,
+            })
+
+    return rows
+
+
 def main():
     DATA_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    tokenizer = load_tokenizer()
-    all_chunks = []
-
-    for pdf_path in DATA_RAW_DIR.glob("*.pdf"):
-        doc_name = pdf_path.stem
-
-        for page_num, page_text in extract_pages(pdf_path):
-            chunks = dynamic_chunk_page(
-                tokenizer=tokenizer,
-                doc_name=doc_name,
-                page_num=page_num,
-                page_text=page_text,
-                max_tokens=CHUNK_MAX_TOKENS,
-                overlap=CHUNK_TOKEN_OVERLAP,
-            )
-
-            for c in chunks:
-                all_chunks.append({
-                    "text": c.text,
-                    "metadata": c.metadata,
-                })
-
-    with open(CHUNKS_JSONL, "w", encoding="utf-8") as f:
-        for row in all_chunks:
-            f.write(json.dumps(row, ensure_ascii=False) + "\n")
-
-    print(f"✔ Saved {len(all_chunks)} chunks to {CHUNKS_JSONL}")
+    # pypdf text decoding is CPU-bound, so one PDF per process bypasses the
+    # GIL. Rows are streamed to disk as each PDF completes instead of
+    # accumulating the whole corpus in memory.
+    pdf_paths = sorted(DATA_RAW_DIR.glob("*.pdf"))
+    count = 0
+
+    with open(CHUNKS_JSONL, "wb") as f, \
+            ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        for rows in ex.map(process_pdf, pdf_paths, chunksize=1):
+            for row in rows:
+                f.write(_json_dumpb(row) + b"\n")
+            count += len(rows)
+
+    print(f"✔ Saved {count} chunks to {CHUNKS_JSONL}")
 
 
 if __name__ == "__main__":
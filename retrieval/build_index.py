@@ -1,76 +1,275 @@
+import hashlib
 import json
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
 import faiss
+import httpx
 import numpy as np
-import requests
 
 from settings import (
     CHUNKS_JSONL,
+    EMBED_BATCH_SIZE,
     FAISS_DIR,
+    FAISS_INDEX_TYPE,
+    FAISS_USE_GPU,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_M,
+    IVFPQ_M,
+    IVFPQ_NBITS,
+    IVFPQ_NLIST,
+    IVFSQ_NLIST,
     OLLAMA_EMBED_MODEL,
 )
 
+# One pooled client for the whole indexing run: keep-alive connections are
+# reused across batch POSTs instead of paying a TCP handshake per call.
+# HTTP/2 multiplexing needs the optional h2 package; fall back to HTTP/1.1
+# keep-alive when it is not installed.
+_SESSION_KWARGS = dict(
+    timeout=httpx.Timeout(300.0, connect=10.0),
+    limits=httpx.Limits(
+        max_keepalive_connections=40,
+        max_connections=100,
+        keepalive_expiry=30.0,
+    ),
+)
+try:
+    _SESSION = httpx.Client(http2=True, **_SESSION_KWARGS)
+except ImportError:
+    _SESSION = httpx.Client(**_SESSION_KWARGS)
+
+# Comma-separated Ollama base URLs; batches are round-robined across them.
+# Embedding is I/O-bound on the Ollama server, so threads scale it fine.
+_EMBED_HOSTS = [
+    h.strip().rstrip("/")
+    for h in os.getenv("OLLAMA_EMBED_HOSTS", "http://localhost:11434").split(",")
+    if h.strip()
+]
+_EMBED_WORKERS = 2 * len(_EMBED_HOSTS)
+
+try:
+    import orjson
+
+    def _json_dumpb(obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; stdlib json works, just slower
+
+    def _json_dumpb(obj, indent: bool = False) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+    _json_loads = json.loads
+
 # -----------------------------
 # Ollama embedding helper
 # -----------------------------
 
-def embed_texts(texts: List[str]) -> np.ndarray:
+def _embed_texts_legacy(texts: List[str], host: str) -> List[List[float]]:
     """
-    Calls Ollama to embed a list of texts.
-    Shows progress and timing.
+    One /api/embeddings call per text. Only used as a fallback for old
+    Ollama versions whose /api/embed does not return "embeddings".
     """
     embeddings = []
-    total = len(texts)
-    start_time = time.time()
-
-    for i, text in enumerate(texts, 1):
-        t0 = time.time()
-
-        response = requests.post(
-            "http://localhost:11434/api/embeddings",
+    for text in texts:
+        response = _SESSION.post(
+            f"{host}/api/embeddings",
             json={
                 "model": OLLAMA_EMBED_MODEL,
                 "prompt": text,
             },
-            timeout=120,
         )
         response.raise_for_status()
-        data = response.json()
-        embeddings.append(data["embedding"])
+        embeddings.append(response.json()["embedding"])
+    return embeddings
+
+
+def _post_batch(item: Tuple[int, List[str]]) -> List[List[float]]:
+    """Embed one positioned batch against its round-robin host."""
+    pos, batch = item
+    host = _EMBED_HOSTS[pos % len(_EMBED_HOSTS)]
+
+    response = _SESSION.post(
+        f"{host}/api/embed",
+        json={
+            "model": OLLAMA_EMBED_MODEL,
+            "input": batch,
+        },
+    )
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        # Old Ollama without the batched endpoint answers 404/405.
+        if response.status_code in (404, 405):
+            return _embed_texts_legacy(batch, host)
+        raise
+    data = response.json()
+
+    if "embeddings" in data:
+        return data["embeddings"]
+    # Batched endpoint exists but returned an unexpected shape.
+    return _embed_texts_legacy(batch, host)
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Calls Ollama to embed a list of texts: batched through /api/embed and
+    fanned out across worker threads (and hosts, via OLLAMA_EMBED_HOSTS).
+    Embeddings stream into a disk-backed memmap as batches arrive, so peak
+    RAM stays flat instead of holding a Python list plus the final array.
+    Shows progress and timing.
+    """
+    total = len(texts)
+    if not total:
+        return np.empty((0, 0), dtype="float32")
+
+    start_time = time.time()
+
+    batches = [
+        texts[i:i + EMBED_BATCH_SIZE]
+        for i in range(0, total, EMBED_BATCH_SIZE)
+    ]
+
+    vectors = None
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=_EMBED_WORKERS) as ex:
+        # executor.map preserves batch order, so embeddings line up with texts.
+        for batch_emb in ex.map(_post_batch, enumerate(batches)):
+            batch_arr = np.asarray(batch_emb, dtype="float32")
 
-        dt = time.time() - t0
+            if vectors is None:
+                # Dimension comes from the first response.
+                vectors = np.memmap(
+                    FAISS_DIR / "embeddings.f32",
+                    dtype="float32",
+                    mode="w+",
+                    shape=(total, batch_arr.shape[1]),
+                )
+
+            vectors[done:done + len(batch_arr)] = batch_arr
+            done += len(batch_arr)
 
-        if i % 10 == 0 or i == 1:
             elapsed = time.time() - start_time
-            avg = elapsed / i
-            remaining = avg * (total - i)
+            avg = elapsed / done
+            remaining = avg * (total - done)
 
             print(
-                f"[{i}/{total}] "
-                f"{dt:.2f}s | avg {avg:.2f}s | ETA {remaining/60:.1f} min",
+                f"[{done}/{total}] "
+                f"avg {avg:.2f}s/text | ETA {remaining/60:.1f} min",
                 flush=True
             )
 
-    return np.array(embeddings, dtype="float32")
+    vectors.flush()
+    return vectors
 
 
 # -----------------------------
 # Main indexing pipeline
 # -----------------------------
 
+def _make_index(dim: int) -> "faiss.Index":
+    """
+    Builds the index configured by FAISS_INDEX_TYPE in settings.py.
+    """
+    if FAISS_INDEX_TYPE == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+
+    if FAISS_INDEX_TYPE == "ivfsq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFScalarQuantizer(
+            quantizer, dim, IVFSQ_NLIST,
+            faiss.ScalarQuantizer.QT_8bit,
+            faiss.METRIC_INNER_PRODUCT,
+        )
+
+    if FAISS_INDEX_TYPE == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(
+            quantizer, dim, IVFPQ_NLIST, IVFPQ_M, IVFPQ_NBITS,
+            faiss.METRIC_INNER_PRODUCT,
+        )
+
+    return faiss.IndexFlatIP(dim)
+
+
+def _stable_ids(metadatas: List[dict], texts: List[str]) -> np.ndarray:
+    """
+    Deterministic 63-bit external ids derived from each chunk's metadata and
+    content, so a rebuild that reorders chunks keeps the same labels.
+    blake2b rather than hash(): Python string hashes are salted per process.
+    Byte-identical chunks under the same doc/page/section are disambiguated
+    by an occurrence counter — they are interchangeable, so which copy gets
+    which label does not affect stability.
+    """
+    ids = np.empty(len(texts), dtype="int64")
+    seen: Dict[Tuple, int] = {}
+
+    for i, (meta, text) in enumerate(zip(metadatas, texts)):
+        text_digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+        base = (meta.get("doc_name"), meta.get("page"), meta.get("section"), text_digest)
+        occ = seen.get(base, 0)
+        seen[base] = occ + 1
+
+        key = f"{base[0]}|{base[1]}|{base[2]}|{text_digest}|{occ}"
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        ids[i] = int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+    return ids
+
+
+def _maybe_to_gpu(index: "faiss.Index") -> Tuple["faiss.Index", bool]:
+    """
+    Moves the index to GPU 0 when FAISS_USE_GPU is set and a faiss-gpu
+    install with a device is available. Training and add run an order of
+    magnitude faster there for IVF-style indexes.
+    """
+    if not FAISS_USE_GPU:
+        return index, False
+
+    if getattr(faiss, "get_num_gpus", lambda: 0)() < 1:
+        print("⚠ FAISS_USE_GPU is set but no GPU-capable faiss was found", flush=True)
+        return index, False
+
+    res = faiss.StandardGpuResources()
+    return faiss.index_cpu_to_gpu(res, 0, index), True
+
+
+def _check_faiss_build():
+    """
+    Warn when faiss is the generic (non-SIMD) build. The avx2/avx512
+    variants (e.g. conda's mkl faiss-cpu) are 2-4x faster on the exact
+    L2/IP kernels and IVF training this pipeline leans on.
+    """
+    try:
+        opts = faiss.get_compile_options()
+    except AttributeError:
+        return
+    if "AVX" not in opts:
+        print(
+            f"⚠ faiss compiled without AVX2/AVX-512 ({opts.strip() or 'generic'}); "
+            "consider an avx2/MKL build for 2-4x faster search",
+            flush=True,
+        )
+
+
 def main():
     FAISS_DIR.mkdir(parents=True, exist_ok=True)
+    _check_faiss_build()
 
     texts = []
     metadatas = []
 
     # 1. Load chunks
-    with open(CHUNKS_JSONL, "r", encoding="utf-8") as f:
+    with open(CHUNKS_JSONL, "rb") as f:
         for line in f:
-            row = json.loads(line)
+            row = _json_loads(line)
             texts.append(row["text"])
             metadatas.append(row["metadata"])
 
@@ -82,15 +281,31 @@ def main():
 
     print(f"Embedding dimension: {dim}")
 
+    # mxbai embeddings are trained for cosine similarity: normalize once so
+    # inner product over unit vectors is cosine.
+    faiss.normalize_L2(vectors)
+
     # 3. Build FAISS index
-    index = faiss.IndexFlatL2(dim)
-    index.add(vectors)
+    index, on_gpu = _maybe_to_gpu(_make_index(dim))
+    if not index.is_trained:
+        index.train(vectors)
+    if on_gpu:
+        # Back to CPU for the IDMap wrap and persistence.
+        index = faiss.index_gpu_to_cpu(index)
+
+    # Stable content-derived ids decouple the served index from row order:
+    # a rebuild that shuffles chunks keeps returning the same labels.
+    ids = _stable_ids(metadatas, texts)
+    for meta, vid in zip(metadatas, ids):
+        meta["vec_id"] = int(vid)
+
+    index = faiss.IndexIDMap2(index)
+    index.add_with_ids(vectors, ids)
 
     # 4. Persist index and metadata
     faiss.write_index(index, str(FAISS_DIR / "index.faiss"))
 
-    with open(FAISS_DIR / "metadata.json", "w", encoding="utf-8") as f:
-        json.dump(metadatas, f, ensure_ascii=False, indent=2)
+    (FAISS_DIR / "metadata.json").write_bytes(_json_dumpb(metadatas, indent=True))
 
     print(f"✔ FAISS index saved to {FAISS_DIR}")
 
@@ -2,7 +2,7 @@ import re
 from dataclasses import dataclass
 from typing import List, Dict, Any, Tuple
 
-from transformers import AutoTokenizer
+from tokenizers import Tokenizer
 
 
 @dataclass
@@ -25,34 +25,47 @@ BULLET_RE = re.compile(r"(?m)^\s*(?:[-•*]|\d+\)|\d+\.)\s+")
 # Table-like lines: multiple spaces or pipes
 TABLE_RE = re.compile(r"(?:\s{2,}|\|)")
 
+# Whole-text variants of the line classes above ([^\S\n] = any whitespace
+# except newline, so matches stay within one line). Each finditer pass marks
+# the start offsets of every matching line in one C-level scan.
+BLANK_LINE_RE = re.compile(r"(?m)^[^\S\n]*$")
+BULLET_LINE_RE = re.compile(r"(?m)^[^\S\n]*(?:[-•*]|\d+\)|\d+\.)[^\S\n]+")
+TABLE_LINE_RE = re.compile(r"(?m)^.*(?:[^\S\n]{2,}|\|)")
+
 
 def load_tokenizer():
     """
     Loads a tokenizer ONLY for counting tokens.
     This does NOT perform embeddings.
+
+    Uses the Rust `tokenizers` backend directly — same vocab as before, but
+    without the slow Python pre/post-processing AutoTokenizer wraps it in.
     """
-    return AutoTokenizer.from_pretrained("bert-base-uncased")
+    return Tokenizer.from_pretrained("bert-base-uncased")
 
 
 # ---------- Helper functions ----------
 
-def _token_windows(tokenizer, text: str, max_tokens: int, overlap: int) -> List[str]:
+def _token_windows(text: str, offsets: List[Tuple[int, int]], max_tokens: int, overlap: int) -> List[str]:
     """
-    Splits text into overlapping token windows.
+    Splits a block into overlapping token windows, sliced out of the
+    original text by the encoding's character offsets — no decode round-trip,
+    and the source whitespace is preserved verbatim.
     Used only when a block is too large.
     """
-    tokens = tokenizer.encode(text, add_special_tokens=False)
-    if not tokens:
+    n = len(offsets)
+    if not n:
         return []
 
     windows = []
     step = max_tokens - overlap
     i = 0
 
-    while i < len(tokens):
-        window_tokens = tokens[i:i + max_tokens]
-        windows.append(tokenizer.decode(window_tokens).strip())
-        if i + max_tokens >= len(tokens):
+    while i < n:
+        start = offsets[i][0]
+        end = offsets[min(i + max_tokens, n) - 1][1]
+        windows.append(text[start:end].strip())
+        if i + max_tokens >= n:
             break
         i += step
 
@@ -64,17 +77,16 @@ def _split_by_sections(text: str) -> List[Tuple[str, str]]:
     Splits text by NICE-style section IDs.
     If none exist, returns a single section.
     """
-    matches = list(SECTION_ID_RE.finditer(text))
-    if not matches:
+    # One C-level split pass; the captured group interleaves section ids
+    # with their bodies: [preamble, sid1, body1, sid2, body2, ...].
+    parts = SECTION_ID_RE.split(text)
+    if len(parts) == 1:
         return [("NO_SECTION", text.strip())]
 
-    sections = []
-    for i, m in enumerate(matches):
-        start = m.start()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        sections.append((m.group("section"), text[start:end].strip()))
-
-    return sections
+    return [
+        (sid, f"{sid} {body}".strip())
+        for sid, body in zip(parts[1::2], parts[2::2])
+    ]
 
 
 def _split_section_into_blocks(section_text: str) -> List[str]:
@@ -84,7 +96,22 @@ def _split_section_into_blocks(section_text: str) -> List[str]:
     - table-like blocks
     - paragraphs
     """
-    lines = section_text.splitlines()
+    lines = section_text.split("\n")
+    n = len(lines)
+
+    # Classify every line upfront with three whole-text regex passes; the
+    # merge loop below then runs on O(1) set lookups instead of calling
+    # strip/match/search per line per branch.
+    starts = []
+    pos = 0
+    for line in lines:
+        starts.append(pos)
+        pos += len(line) + 1
+
+    blank_at = {m.start() for m in BLANK_LINE_RE.finditer(section_text)}
+    bullet_at = {m.start() for m in BULLET_LINE_RE.finditer(section_text)}
+    table_at = {m.start() for m in TABLE_LINE_RE.finditer(section_text)}
+
     blocks = []
     buffer = []
 
@@ -95,35 +122,35 @@ def _split_section_into_blocks(section_text: str) -> List[str]:
             buffer = []
 
     i = 0
-    while i < len(lines):
-        line = lines[i]
+    while i < n:
+        s = starts[i]
 
-        if not line.strip():
+        if s in blank_at:
             flush()
             i += 1
             continue
 
-        if BULLET_RE.match(line):
+        if s in bullet_at:
             flush()
-            b = [line]
+            b = [lines[i]]
             i += 1
-            while i < len(lines) and (lines[i].startswith(" ") or BULLET_RE.match(lines[i])):
+            while i < n and (lines[i].startswith(" ") or starts[i] in bullet_at):
                 b.append(lines[i])
                 i += 1
             blocks.append("\n".join(b).strip())
             continue
 
-        if TABLE_RE.search(line):
+        if s in table_at:
             flush()
-            t = [line]
+            t = [lines[i]]
             i += 1
-            while i < len(lines) and TABLE_RE.search(lines[i]):
+            while i < n and starts[i] in table_at:
                 t.append(lines[i])
                 i += 1
             blocks.append("\n".join(t).strip())
             continue
 
-        buffer.append(line)
+        buffer.append(lines[i])
         i += 1
 
     flush()
@@ -147,27 +174,39 @@ def dynamic_chunk_page(
 
     sections = _split_by_sections(page_text)
 
-    for section_id, section_text in sections:
-        blocks = _split_section_into_blocks(section_text)
-
-        for block in blocks:
-            token_windows = _token_windows(
-                tokenizer,
-                block,
-                max_tokens=max_tokens,
-                overlap=overlap,
-            )
+    # Collect every block on the page first so the whole page is tokenized
+    # in one Rust call instead of dozens of small per-block encodes.
+    all_blocks: List[str] = []
+    block_section_ids: List[str] = []
 
-            for text in token_windows:
-                chunks.append(
-                    Chunk(
-                        text=text,
-                        metadata={
-                            "doc_name": doc_name,
-                            "page": page_num,
-                            "section": section_id,
-                        },
-                    )
+    for section_id, section_text in sections:
+        for block in _split_section_into_blocks(section_text):
+            all_blocks.append(block)
+            block_section_ids.append(section_id)
+
+    if not all_blocks:
+        return chunks
+
+    encodings = tokenizer.encode_batch(all_blocks, add_special_tokens=False)
+
+    for block, section_id, encoding in zip(all_blocks, block_section_ids, encodings):
+        token_windows = _token_windows(
+            block,
+            encoding.offsets,
+            max_tokens=max_tokens,
+            overlap=overlap,
+        )
+
+        for text in token_windows:
+            chunks.append(
+                Chunk(
+                    text=text,
+                    metadata={
+                        "doc_name": doc_name,
+                        "page": page_num,
+                        "section": section_id,
+                    },
                 )
+            )
 
     return chunks
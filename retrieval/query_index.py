@@ -1,45 +1,304 @@
+import asyncio
+import functools
 import json
+import re
 from typing import List, Dict, Any, Optional
 
 import faiss
+import httpx
 import numpy as np
-import requests
 
-from .settings import FAISS_DIR, OLLAMA_EMBED_MODEL, TOP_K
+from .settings import FAISS_DIR, HNSW_EF_SEARCH, IVF_NPROBE, OLLAMA_EMBED_MODEL, TOP_K
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; stdlib json works, just slower
+    _json_loads = json.loads
+
+# Async clients pooled per event loop: each asyncio.run call gets its own
+# loop, and keep-alive connections bound to a closed loop raise
+# "Event loop is closed" when a later loop tries to reuse them.
+_ASYNC_CLIENTS: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        # Drop clients stranded on loops that have since closed.
+        for stale in [l for l in _ASYNC_CLIENTS if l.is_closed()]:
+            del _ASYNC_CLIENTS[stale]
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=60.0,
+        )
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+# Pooled sync client so repeated queries reuse a keep-alive connection
+# instead of opening a fresh socket per embedding call. HTTP/2 multiplexing
+# is used when the optional h2 package is available.
+_CLIENT_KWARGS = dict(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    timeout=60.0,
+)
+try:
+    _CLIENT = httpx.Client(http2=True, **_CLIENT_KWARGS)
+except ImportError:
+    _CLIENT = httpx.Client(**_CLIENT_KWARGS)
 
 
 def embed_query(text: str) -> np.ndarray:
-    r = requests.post(
+    r = _CLIENT.post(
         "http://localhost:11434/api/embeddings",
         json={"model": OLLAMA_EMBED_MODEL, "prompt": text},
-        timeout=60,
     )
     r.raise_for_status()
     emb = r.json()["embedding"]
     return np.array([emb], dtype="float32")
 
 
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """
+    Embed several queries in one Ollama call via /api/embed, which accepts a
+    list input and runs a single batched forward pass.
+    """
+    r = _CLIENT.post(
+        "http://localhost:11434/api/embed",
+        json={"model": OLLAMA_EMBED_MODEL, "input": texts},
+    )
+    r.raise_for_status()
+    return np.array(r.json()["embeddings"], dtype="float32")
+
+
+async def embed_query_async(text: str) -> np.ndarray:
+    r = await _get_async_client().post(
+        "http://localhost:11434/api/embeddings",
+        json={"model": OLLAMA_EMBED_MODEL, "prompt": text},
+    )
+    r.raise_for_status()
+    emb = r.json()["embedding"]
+    return np.array([emb], dtype="float32")
+
+
+@functools.lru_cache(maxsize=1)
 def load_index():
-    return faiss.read_index(str(FAISS_DIR / "index.faiss"))
+    """
+    Reads the index once per process; repeated queries reuse the cached
+    object instead of paying the disk read every call. Rebuild the index?
+    Restart the process (or call load_index.cache_clear()).
+    """
+    index = faiss.read_index(str(FAISS_DIR / "index.faiss"))
 
+    # Apply search-time knobs for whichever ANN type build_index produced
+    # (reaching through the IDMap wrapper when present); a flat index has
+    # neither attribute and passes through untouched.
+    inner = index
+    if isinstance(inner, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        inner = faiss.downcast_index(inner.index)
+    if isinstance(inner, faiss.IndexHNSWFlat):
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = IVF_NPROBE
 
+    return index
+
+
+@functools.lru_cache(maxsize=1)
 def load_metadatas() -> List[Dict[str, Any]]:
-    with open(FAISS_DIR / "metadata.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _json_loads((FAISS_DIR / "metadata.json").read_bytes())
+
+
+@functools.lru_cache(maxsize=1)
+def load_metadata_columns():
+    """
+    Column-oriented view over the metadata: parallel numpy arrays for the
+    fields filtering touches (same SoA layout the research agent's
+    EvidenceStore uses), so domain/doc filters become vectorized masks
+    instead of per-hit dict lookups.
+    """
+    metas = load_metadatas()
+    doc_ids = np.array(
+        [(m.get("doc_id") or m.get("doc_name") or "") for m in metas],
+        dtype=object,
+    )
+    domains = np.array(
+        [m.get("domain") or infer_domain(m.get("doc_name")) for m in metas],
+        dtype=object,
+    )
+    return doc_ids, domains
+
+
+@functools.lru_cache(maxsize=1)
+def _vector_ids() -> np.ndarray:
+    """
+    External FAISS label for each metadata row. Indexes built before the
+    IDMap wrap have no vec_id; the row position doubles as the label there.
+    """
+    metas = load_metadatas()
+    return np.array(
+        [m.get("vec_id", i) for i, m in enumerate(metas)],
+        dtype="int64",
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _label_to_row() -> Dict[int, int]:
+    return {int(v): i for i, v in enumerate(_vector_ids())}
+
+
+# All domain keywords in one alternation: the matched group names the domain,
+# so inference is a single C-level scan instead of a chain of `in` checks.
+_DOMAIN_RE = re.compile(
+    r"(?P<adhd>adhd|attention-deficit|hyperactivity)"
+    r"|(?P<dementia>dementia|alzheim)"
+    r"|(?P<autism>autism|asd)"
+    r"|(?P<psychosis>psychosis|schiz|sign-?145)",
+    re.IGNORECASE,
+)
 
 
 def infer_domain(doc_name: str) -> str:
-    n = (doc_name or "").lower()
+    m = _DOMAIN_RE.search(doc_name or "")
+    return m.lastgroup if m else "other"
+
+
+def _filter_hits(
+    metadatas: List[Dict[str, Any]],
+    idx_row: np.ndarray,
+    dist_row: np.ndarray,
+    top_k: int,
+    allowed_domains: Optional[List[str]],
+    allowed_doc_ids: Optional[List[str]],
+) -> List[Dict[str, Any]]:
+    doc_ids, domains = load_metadata_columns()
+    label_to_row = _label_to_row()
+
+    idx_row = np.asarray(idx_row)
+    dist_row = np.asarray(dist_row)
+
+    # Map external labels back to metadata rows, then filter the whole
+    # overfetched row vectorized; the Python loop below only runs over the
+    # top_k survivors.
+    keep = idx_row >= 0
+    labels = idx_row[keep]
+    dists = dist_row[keep]
+
+    cand = np.fromiter(
+        (label_to_row.get(int(label), -1) for label in labels),
+        dtype="int64",
+        count=len(labels),
+    )
+    known = cand >= 0
+    cand, dists = cand[known], dists[known]
+
+    if allowed_domains:
+        mask = np.isin(domains[cand], list(allowed_domains))
+        cand, dists = cand[mask], dists[mask]
+    if allowed_doc_ids:
+        mask = np.isin(doc_ids[cand], list(allowed_doc_ids))
+        cand, dists = cand[mask], dists[mask]
+
+    out = []
+    top_k = int(top_k)
+    for rank, (idx, dist) in enumerate(zip(cand[:top_k], dists[:top_k]), start=1):
+        idx = int(idx)
+        meta = metadatas[idx]
+
+        out.append(
+            {
+                "rank": rank,
+                "idx": idx,
+                # The index returns cosine similarity (inner product of unit
+                # vectors); expose cosine distance so lower stays better for
+                # downstream thresholds.
+                "distance": float(1.0 - dist),
+                "doc_name": meta.get("doc_name"),
+                "doc_id": doc_ids[idx],
+                "domain": domains[idx],
+                "page": meta.get("page"),
+                "section": meta.get("section"),
+            }
+        )
 
-    if "adhd" in n or "attention-deficit" in n or "hyperactivity" in n:
-        return "adhd"
-    if "dementia" in n or "alzheim" in n:
-        return "dementia"
-    if "autism" in n or "asd" in n:
-        return "autism"
-    if "psychosis" in n or "schiz" in n or "sign145" in n or "sign-145" in n:
-        return "psychosis"
-    return "other"
+    return out
+
+
+@functools.lru_cache(maxsize=32)
+def _id_selector(domains_key: Optional[tuple], doc_ids_key: Optional[tuple]):
+    """
+    Cached IDSelector over the rows matching the given filters. Caching
+    keeps the selector (and its id array) alive and avoids rebuilding the
+    mask for repeated filter combinations.
+    """
+    doc_ids, domains = load_metadata_columns()
+
+    mask = np.ones(len(domains), dtype=bool)
+    if domains_key:
+        mask &= np.isin(domains, domains_key)
+    if doc_ids_key:
+        mask &= np.isin(doc_ids, doc_ids_key)
+
+    # Selector ids are the index's external labels, not row positions.
+    return faiss.IDSelectorBatch(_vector_ids()[np.flatnonzero(mask)])
+
+
+def _search_params(index, allowed_domains, allowed_doc_ids):
+    """
+    SearchParameters restricting the scan to allowed ids inside faiss,
+    or None when unfiltered (or on faiss builds without selectors).
+    """
+    if not allowed_domains and not allowed_doc_ids:
+        return None
+    if not hasattr(faiss, "IDSelectorBatch"):
+        return None
+
+    sel = _id_selector(
+        tuple(sorted(allowed_domains)) if allowed_domains else None,
+        tuple(sorted(allowed_doc_ids)) if allowed_doc_ids else None,
+    )
+
+    inner = index
+    if isinstance(inner, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        inner = faiss.downcast_index(inner.index)
+
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=IVF_NPROBE)
+    if isinstance(inner, faiss.IndexHNSWFlat):
+        # HNSW rejects any params object that isn't SearchParametersHNSW;
+        # on faiss builds without it, fall back to overfetch-and-filter.
+        if hasattr(faiss, "SearchParametersHNSW"):
+            return faiss.SearchParametersHNSW(sel=sel, efSearch=HNSW_EF_SEARCH)
+        return None
+    return faiss.SearchParameters(sel=sel)
+
+
+def _search_hits(
+    qvec: np.ndarray,
+    top_k: int,
+    allowed_domains: Optional[List[str]],
+    allowed_doc_ids: Optional[List[str]],
+    overfetch: int,
+) -> List[Dict[str, Any]]:
+    index = load_index()
+    metadatas = load_metadatas()
+
+    # Match the index's cosine metric: unit-normalize the query vector.
+    faiss.normalize_L2(qvec)
+
+    params = _search_params(index, allowed_domains, allowed_doc_ids)
+    if params is not None:
+        # The selector restricts the scan inside faiss, so no overfetch and
+        # no Python-side filtering are needed.
+        distances, indices = index.search(qvec, int(top_k), params=params)
+        return _filter_hits(metadatas, indices[0], distances[0], top_k, None, None)
+
+    k = max(int(overfetch), int(top_k))
+    distances, indices = index.search(qvec, k)
+
+    return _filter_hits(metadatas, indices[0], distances[0], top_k, allowed_domains, allowed_doc_ids)
 
 
 def query_index(
@@ -49,49 +308,57 @@ def query_index(
     allowed_doc_ids: Optional[List[str]] = None,
     overfetch: int = 50,
 ) -> List[Dict[str, Any]]:
-    index = load_index()
-    metadatas = load_metadatas()
-
     qvec = embed_query(query)
+    return _search_hits(qvec, top_k, allowed_domains, allowed_doc_ids, overfetch)
 
-    k = max(int(overfetch), int(top_k))
-    distances, indices = index.search(qvec, k)
 
-    out = []
-    for idx, dist in zip(indices[0], distances[0]):
-        if idx < 0:
-            continue
+def query_index_batch(
+    queries: List[str],
+    top_k: int = TOP_K,
+    allowed_domains: Optional[List[str]] = None,
+    allowed_doc_ids: Optional[List[str]] = None,
+    overfetch: int = 50,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Search several queries at once: one batched embedding call and one FAISS
+    search over the whole query matrix, then per-row filtering.
+    """
+    if not queries:
+        return []
 
-        meta = metadatas[int(idx)]
-        doc_name = meta.get("doc_name")
-        doc_id = meta.get("doc_id") or doc_name
+    qvecs = embed_queries(queries)
+    faiss.normalize_L2(qvecs)
 
-        domain = meta.get("domain")
-        if not domain:
-            domain = infer_domain(doc_name)
+    index = load_index()
+    metadatas = load_metadatas()
 
-        if allowed_domains and domain not in allowed_domains:
-            continue
-        if allowed_doc_ids and doc_id not in allowed_doc_ids:
-            continue
+    params = _search_params(index, allowed_domains, allowed_doc_ids)
+    if params is not None:
+        distances, indices = index.search(qvecs, int(top_k), params=params)
+        return [
+            _filter_hits(metadatas, indices[i], distances[i], top_k, None, None)
+            for i in range(len(queries))
+        ]
 
-        out.append(
-            {
-                "rank": len(out) + 1,
-                "idx": int(idx),
-                "distance": float(dist),
-                "doc_name": doc_name,
-                "doc_id": doc_id,
-                "domain": domain,
-                "page": meta.get("page"),
-                "section": meta.get("section"),
-            }
-        )
+    k = max(int(overfetch), int(top_k))
+    distances, indices = index.search(qvecs, k)
 
-        if len(out) >= int(top_k):
-            break
+    return [
+        _filter_hits(metadatas, indices[i], distances[i], top_k, allowed_domains, allowed_doc_ids)
+        for i in range(len(queries))
+    ]
 
-    return out
+
+async def query_index_async(
+    query: str,
+    top_k: int = TOP_K,
+    allowed_domains: Optional[List[str]] = None,
+    allowed_doc_ids: Optional[List[str]] = None,
+    overfetch: int = 50,
+) -> List[Dict[str, Any]]:
+    """Async variant of query_index; only the embedding call awaits the network."""
+    qvec = await embed_query_async(query)
+    return _search_hits(qvec, top_k, allowed_domains, allowed_doc_ids, overfetch)
 
 
 if __name__ == "__main__":
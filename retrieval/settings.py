@@ -7,12 +7,43 @@ DATA_OUT_DIR = PROJECT_ROOT / "data" / "processed"
 
 FAISS_DIR = DATA_OUT_DIR / "faiss_index"
 CHUNKS_JSONL = DATA_OUT_DIR / "chunks.jsonl"
+PLAN_CACHE_JSONL = DATA_OUT_DIR / "plan_cache.jsonl"
 
 CHUNKING_MODE = "dynamic_tokens"
 
+# "fitz" (PyMuPDF) is 10-40x faster at text extraction; set to "pypdf" for
+# documents that fitz misparses. Falls back to pypdf when fitz is missing.
+PDF_BACKEND = "fitz"
+
 CHUNK_MAX_TOKENS = 280
 CHUNK_TOKEN_OVERLAP = 50
 
 OLLAMA_EMBED_MODEL = "mxbai-embed-large:latest"
 
+# Texts per /api/embed call when building the index. 32 is a safe default
+# for CPU/MPS; raise towards 128 on a CUDA-backed Ollama.
+EMBED_BATCH_SIZE = 32
+
 TOP_K = 6
+
+# FAISS index type: "flat" is exact brute-force; "hnsw" is an ANN graph
+# (orders-of-magnitude faster queries at 95%+ recall); "ivfsq" stores
+# int8 codes (4x less RAM, minor recall loss); "ivfpq" compresses hardest,
+# for corpora past ~1M chunks.
+FAISS_INDEX_TYPE = "hnsw"
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+IVFPQ_NLIST = 1024
+IVFPQ_M = 16
+IVFPQ_NBITS = 8
+IVF_NPROBE = 16
+
+# Tune towards 4*sqrt(n_chunks) for the corpus being indexed.
+IVFSQ_NLIST = 256
+
+# Build (train/add) the index on GPU when a faiss-gpu install and a device
+# are present; the persisted index is converted back to CPU form.
+FAISS_USE_GPU = False